@@ -1,3 +1,26 @@
+from .execute import apply_actions
+from .scale import (
+    Action,
+    PlanContext,
+    ProcessScale,
+    ScaleProcess,
+    SetMaintenanceMode,
+    UpdateConfigVars,
+    plan,
+)
 from .schedule import parse_schedule
+from .state import AppState, FormationState
 
-__all__ = ["parse_schedule"]
+__all__ = [
+    "Action",
+    "AppState",
+    "FormationState",
+    "PlanContext",
+    "ProcessScale",
+    "ScaleProcess",
+    "SetMaintenanceMode",
+    "UpdateConfigVars",
+    "apply_actions",
+    "parse_schedule",
+    "plan",
+]
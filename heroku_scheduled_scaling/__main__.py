@@ -1,36 +1,202 @@
+import argparse
 import concurrent.futures
 import os
+import time
+from collections import Counter
+from dataclasses import replace
 from traceback import print_exception
 
+import requests
 import sentry_sdk
+from heroku3.core import Heroku
 
-from .scale import scale_app
+from .circuit import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    get_circuit_breaker,
+    is_api_degraded,
+)
+from .execute import scale_app
+from .lock import RunLock, get_run_lock
+from .profiling import SamplingProfiler
+from .scale import PlanContext, logger
+from .state import AppState
 from .utils import get_heroku_apps, get_heroku_client
 
 
-def main() -> None:
-    if sentry_dsn := os.environ.get("SENTRY_DSN"):
-        sentry_sdk.init(sentry_dsn)
+def scale_app_while_locked(
+    run_lock: RunLock,
+    circuit_breaker: CircuitBreaker,
+    heroku: Heroku,
+    app: AppState,
+    context: PlanContext,
+) -> None:
+    if not run_lock.held:
+        # The lease was lost to another run - leave the remaining apps to it
+        return
+
+    # Scale a copy, so the app's formations and config are only held whilst it's
+    # being scaled, rather than for the rest of the run
+    circuit_breaker.call(scale_app, heroku, replace(app), context)
+
 
-    apps = get_heroku_apps()
+def get_failure_type(exception: BaseException) -> str:
+    """
+    Group failures by type (and status), as their messages contain the app's URL.
+    """
+    if isinstance(exception, requests.HTTPError) and exception.response is not None:
+        return f"{type(exception).__name__} {exception.response.status_code}"
 
-    requests_pool_size = (
-        get_heroku_client()._session.adapters["https://"]._pool_connections  # type: ignore[attr-defined]
+    return type(exception).__name__
+
+
+def report_degraded_run(exceptions: list[BaseException], skipped: int) -> None:
+    """
+    Send a single report for a run cut short by the circuit breaker, rather than
+    one for each failed app.
+    """
+    failures = Counter(get_failure_type(e) for e in exceptions)
+
+    message = (
+        f"Heroku API degraded: {failures.total()} apps failed, {skipped} apps skipped"
     )
+    logger.error(message)
+
+    with sentry_sdk.new_scope() as scope:
+        scope.set_context(
+            "failures", {"skipped": skipped, **dict(failures.most_common(10))}
+        )
+        sentry_sdk.capture_message(message, level="error")
+
+
+def scale_apps_concurrently(
+    executor: concurrent.futures.Executor,
+    run_lock: RunLock,
+    circuit_breaker: CircuitBreaker,
+    heroku: Heroku,
+    apps: list[AppState],
+    context: PlanContext,
+) -> tuple[list[AppState], list[BaseException]]:
+    """
+    Scale apps, returning those skipped whilst the circuit was open, and the
+    exceptions raised scaling the rest.
+    """
+    futures = {
+        executor.submit(
+            scale_app_while_locked, run_lock, circuit_breaker, heroku, app, context
+        ): app
+        for app in apps
+    }
+
+    skipped = []
+    exceptions = []
+    for future in concurrent.futures.as_completed(futures):
+        if isinstance(exception := future.exception(), CircuitOpenError):
+            skipped.append(futures[future])
+        elif exception is not None:
+            exceptions.append(exception)
+            print_exception(exception)
+
+    return skipped, exceptions
+
+
+def scale_apps() -> None:
+    # Load configuration first, so invalid configuration can't leave the lock held
+    run_lock = get_run_lock()
+    circuit_breaker = get_circuit_breaker()
+    context = PlanContext.from_environ()
+
+    if not run_lock.acquire():
+        logger.info("Another run is already in progress")
+        return
+
+    try:
+        heroku = get_heroku_client()
+        apps = get_heroku_apps(heroku)
 
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=min(
-            int(os.environ.get("CONCURRENCY", requests_pool_size)), requests_pool_size
+        requests_pool_size = (
+            heroku._session.adapters["https://"]._pool_connections  # type: ignore[attr-defined]
         )
-    ) as executor:
-        futures = []
-        for app in apps:
-            futures.append(executor.submit(scale_app, app))
-
-        for future in concurrent.futures.as_completed(futures):
-            if exception := future.exception():
-                sentry_sdk.capture_exception(exception)
-                print_exception(exception)
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(
+                int(os.environ.get("CONCURRENCY", requests_pool_size)),
+                requests_pool_size,
+            )
+        ) as executor:
+            skipped, exceptions = scale_apps_concurrently(
+                executor, run_lock, circuit_breaker, heroku, apps, context
+            )
+
+            # Skipped apps are rejected as soon as they're picked up, so once the
+            # circuit is half-open, probe it with a single app, and if that
+            # succeeds, retry the rest.
+            while skipped and run_lock.held:
+                time.sleep(circuit_breaker.time_until_half_open())
+
+                probe = skipped.pop()
+                try:
+                    scale_app_while_locked(
+                        run_lock, circuit_breaker, heroku, probe, context
+                    )
+                except CircuitOpenError:
+                    skipped.append(probe)
+                    break
+                except Exception as e:
+                    exceptions.append(e)
+                    print_exception(e)
+
+                if circuit_breaker.state == CircuitState.OPEN:
+                    # The probe failed (or was too slow)
+                    break
+
+                if circuit_breaker.state == CircuitState.HALF_OPEN:
+                    # The probe failed for its own reasons (eg invalid
+                    # configuration), so try another
+                    continue
+
+                logger.info("Retrying %d skipped apps", len(skipped))
+                skipped, retry_exceptions = scale_apps_concurrently(
+                    executor, run_lock, circuit_breaker, heroku, skipped, context
+                )
+                exceptions.extend(retry_exceptions)
+
+        if circuit_breaker.tripped:
+            report_degraded_run(
+                [e for e in exceptions if is_api_degraded(e)], len(skipped)
+            )
+            exceptions = [e for e in exceptions if not is_api_degraded(e)]
+
+        for exception in exceptions:
+            sentry_sdk.capture_exception(exception)
+    finally:
+        run_lock.release()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scale Heroku dynos on a schedule")
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=os.environ.get("SCALING_PROFILE"),
+        help="Profile the run, writing collapsed stacks to PATH",
+    )
+    args = parser.parse_args()
+
+    if sentry_dsn := os.environ.get("SENTRY_DSN"):
+        sentry_sdk.init(sentry_dsn)
+
+    if not args.profile:
+        scale_apps()
+        return
+
+    profiler = SamplingProfiler()
+    try:
+        with profiler:
+            scale_apps()
+    finally:
+        profiler.write(args.profile)
 
 
 if __name__ == "__main__":
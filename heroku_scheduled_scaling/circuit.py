@@ -0,0 +1,165 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from enum import StrEnum
+from typing import ParamSpec, TypeVar
+
+import requests
+
+logger = logging.getLogger("heroku_scheduled_scaling")
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling through an open circuit
+    """
+
+
+def is_api_degraded(exception: BaseException) -> bool:
+    """
+    Determine whether an exception signals the API is degraded, rather than a
+    problem with a single request (eg an invalid dyno size, or a missing app).
+    """
+    if isinstance(exception, requests.HTTPError):
+        return exception.response is not None and (
+            exception.response.status_code == 429
+            or exception.response.status_code >= 500
+        )
+
+    return isinstance(exception, requests.ConnectionError | requests.Timeout)
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Stop calling a degraded dependency (ie the Platform API).
+
+    Whilst closed, the outcome of the most recent calls is tracked. Calls which
+    raise an exception matching `is_failure`, or take longer than
+    `slow_call_duration`, count as failures. Other exceptions are raised without
+    being counted. Once at
+    least `min_calls` have been made and the failure rate reaches
+    `failure_threshold`, the circuit opens, and calls fail immediately with
+    `CircuitOpenError`.
+
+    After `reset_timeout`, the circuit is half-open, and a single probe call is let
+    through. If it succeeds, the circuit closes again, otherwise it re-opens.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        min_calls: int = 5,
+        window_size: int = 20,
+        slow_call_duration: float = 30,
+        reset_timeout: float = 30,
+        is_failure: Callable[[Exception], bool] = is_api_degraded,
+    ):
+        self.failure_threshold = failure_threshold
+        self.min_calls = min_calls
+        self.slow_call_duration = slow_call_duration
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure
+
+        self.state = CircuitState.CLOSED
+        self.tripped = False
+
+        self._outcomes: deque[bool] = deque(maxlen=window_size)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _before_call(self) -> None:
+        with self._lock:
+            if self.state == CircuitState.CLOSED:
+                return
+
+            if (
+                self.state == CircuitState.OPEN
+                and time.monotonic() - self._opened_at >= self.reset_timeout
+            ):
+                self.state = CircuitState.HALF_OPEN
+
+            if self.state == CircuitState.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+
+            raise CircuitOpenError("Circuit is open - skipping call")
+
+    def _after_call(self, failed: bool) -> None:
+        with self._lock:
+            if self.state == CircuitState.HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    logger.info("Circuit closed - resuming")
+                    self.state = CircuitState.CLOSED
+                    self._outcomes.clear()
+                return
+
+            self._outcomes.append(failed)
+            if (
+                self.state == CircuitState.CLOSED
+                and len(self._outcomes) >= self.min_calls
+                and sum(self._outcomes) / len(self._outcomes) >= self.failure_threshold
+            ):
+                self._open()
+
+    def _cancel_call(self) -> None:
+        with self._lock:
+            if self.state == CircuitState.HALF_OPEN:
+                # Let another probe through
+                self._probing = False
+
+    def _open(self) -> None:
+        logger.error("Circuit opened - skipping remaining calls")
+        self.state = CircuitState.OPEN
+        self.tripped = True
+        self._opened_at = time.monotonic()
+
+    def time_until_half_open(self) -> float:
+        """
+        How long until a probe call will be let through, in seconds.
+        """
+        with self._lock:
+            if self.state != CircuitState.OPEN:
+                return 0
+
+            return max(self._opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def call(self, func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+        self._before_call()
+
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self._after_call(failed=True)
+            else:
+                self._cancel_call()
+            raise
+
+        self._after_call(failed=time.monotonic() - start > self.slow_call_duration)
+        return result
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=float(os.environ.get("CIRCUIT_BREAKER_FAILURE_RATE", 0.5)),
+        min_calls=int(os.environ.get("CIRCUIT_BREAKER_MIN_CALLS", 5)),
+        slow_call_duration=float(os.environ.get("CIRCUIT_BREAKER_SLOW_CALL", 30)),
+        reset_timeout=float(os.environ.get("CIRCUIT_BREAKER_RESET_TIMEOUT", 30)),
+    )
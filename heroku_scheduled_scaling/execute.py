@@ -0,0 +1,125 @@
+import logging
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
+from heroku3.core import Heroku
+
+from .metrics import get_metrics
+from .scale import (
+    Action,
+    PlanContext,
+    ScaleProcess,
+    SetMaintenanceMode,
+    UpdateConfigVars,
+    get_metrics_urls,
+    plan,
+)
+from .state import AppState
+from .utils import (
+    batch_update_formation_processes,
+    load_app_state,
+    set_maintenance_mode,
+    update_config_vars,
+)
+
+logger = logging.getLogger("heroku_scheduled_scaling")
+
+
+def log_scale_process(action: ScaleProcess) -> None:
+    if (formation := action.app.formations.get(action.process)) is None:
+        return
+
+    if formation.quantity != action.scale.quantity:
+        logger.info(
+            "Scaling app %s (%s) to %d dynos (from %d)",
+            action.app.name,
+            action.process,
+            action.scale.quantity,
+            formation.quantity,
+        )
+
+    if (
+        action.scale.size is not None
+        and formation.size.lower() != action.scale.size.lower()
+    ):
+        logger.info(
+            "Resizing app %s (%s) to %s dynos (from %s)",
+            action.app.name,
+            action.process,
+            action.scale.size,
+            formation.size,
+        )
+
+
+def apply_app_actions(heroku: Heroku, app: AppState, actions: list[Action]) -> None:
+    config_vars: dict[str, str | None] = {}
+    scale_processes: list[ScaleProcess] = []
+    maintenance: bool | None = None
+
+    for action in actions:
+        if isinstance(action, UpdateConfigVars):
+            config_vars.update(action.config_vars)
+        elif isinstance(action, ScaleProcess):
+            scale_processes.append(action)
+        elif isinstance(action, SetMaintenanceMode):
+            maintenance = action.maintenance
+
+    if config_vars:
+        update_config_vars(heroku, app, config_vars)
+
+    if scale_processes:
+        for scale_process in scale_processes:
+            log_scale_process(scale_process)
+
+        batch_update_formation_processes(
+            heroku,
+            app,
+            [
+                scale_process.scale.as_formation_update(scale_process.process)
+                for scale_process in scale_processes
+            ],
+        )
+
+    if maintenance is not None:
+        logger.info(
+            "%s maintenance mode for %s",
+            "Enabling" if maintenance else "Disabling",
+            app.name,
+        )
+        set_maintenance_mode(heroku, app, maintenance)
+
+
+def apply_actions(heroku: Heroku, actions: Iterable[Action]) -> None:
+    """
+    Apply planned actions, batching them into as few requests as possible for
+    each app.
+
+    For each app, config vars are updated first, then all processes are scaled in a
+    single request, then maintenance mode is set.
+    """
+    apps: dict[str, AppState] = {}
+    actions_by_app: defaultdict[str, list[Action]] = defaultdict(list)
+
+    for action in actions:
+        apps[action.app.id] = action.app
+        actions_by_app[action.app.id].append(action)
+
+    for app_id, app_actions in actions_by_app.items():
+        apply_app_actions(heroku, apps[app_id], app_actions)
+
+
+def scale_app(
+    heroku: Heroku, app: AppState, context: PlanContext | None = None
+) -> None:
+    load_app_state(heroku, app)
+
+    apply_actions(
+        heroku,
+        plan(
+            [app],
+            datetime.now(UTC),
+            context or PlanContext.from_environ(),
+            get_metrics(get_metrics_urls(app.schedule_vars)),
+        ),
+    )
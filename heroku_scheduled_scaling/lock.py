@@ -0,0 +1,237 @@
+import fcntl
+import json
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any, Protocol
+
+logger = logging.getLogger("heroku_scheduled_scaling")
+
+DEFAULT_LOCK_TTL = 60
+DEFAULT_LOCK_NAME = "heroku-scheduled-scaling"
+
+REDIS_SCHEMES = ("redis://", "rediss://", "unix://")
+
+# Only touch the key if we still own it, so a run which lost its lease can't
+# extend or delete the lease of the run which took over.
+REDIS_RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+REDIS_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseBackend(Protocol):
+    def acquire(self, token: str, ttl: float) -> bool: ...
+    def renew(self, token: str, ttl: float) -> bool: ...
+    def release(self, token: str) -> None: ...
+
+
+class RedisClient(Protocol):
+    """
+    The subset of `redis.Redis` used for leases
+    """
+
+    def set(self, name: str, value: str, *, nx: bool, px: int) -> Any: ...
+    def eval(self, script: str, numkeys: int, *keys_and_args: str) -> Any: ...
+
+
+class FileLeaseBackend:
+    """
+    A lease stored in a local file, for runs sharing a host.
+
+    The lease is a JSON record of its owner and expiry. Reads and writes happen
+    under an exclusive `flock`, and an expired record may be taken over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _open(self) -> Iterator[int]:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _read(self, fd: int) -> dict:
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            record = json.loads(os.read(fd, 4096) or b"{}")
+        except ValueError:
+            return {}
+        return record if isinstance(record, dict) else {}
+
+    def _write(self, fd: int, record: dict) -> None:
+        os.ftruncate(fd, 0)
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, json.dumps(record).encode())
+
+    def acquire(self, token: str, ttl: float) -> bool:
+        with self._open() as fd:
+            record = self._read(fd)
+            if (
+                record.get("token") not in {None, token}
+                and record.get("expires", 0) > time.time()
+            ):
+                return False
+
+            self._write(fd, {"token": token, "expires": time.time() + ttl})
+            return True
+
+    def renew(self, token: str, ttl: float) -> bool:
+        with self._open() as fd:
+            if self._read(fd).get("token") != token:
+                return False
+
+            self._write(fd, {"token": token, "expires": time.time() + ttl})
+            return True
+
+    def release(self, token: str) -> None:
+        with self._open() as fd:
+            if self._read(fd).get("token") == token:
+                self._write(fd, {})
+
+
+class RedisLeaseBackend:
+    """
+    A lease stored in a Redis-compatible server, for runs on separate dynos.
+
+    Expired leases are removed by the server, so stale leases are taken over by
+    the next `SET NX`.
+    """
+
+    def __init__(self, client: RedisClient, key: str = DEFAULT_LOCK_NAME):
+        self.client = client
+        self.key = key
+
+    def acquire(self, token: str, ttl: float) -> bool:
+        return bool(self.client.set(self.key, token, nx=True, px=int(ttl * 1000)))
+
+    def renew(self, token: str, ttl: float) -> bool:
+        return bool(
+            self.client.eval(
+                REDIS_RENEW_SCRIPT, 1, self.key, token, str(int(ttl * 1000))
+            )
+        )
+
+    def release(self, token: str) -> None:
+        self.client.eval(REDIS_RELEASE_SCRIPT, 1, self.key, token)
+
+
+class RunLock:
+    """
+    A lease-based lock held for the duration of a run.
+
+    Whilst held, the lease is renewed in the background every third of its TTL.
+    If the renewal fails (eg the lease expired and another run took it over), or
+    the lease can't be renewed before it expires, `held` becomes `False`, and the
+    run should stop doing work.
+    """
+
+    def __init__(self, backend: LeaseBackend, ttl: float = DEFAULT_LOCK_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.token = secrets.token_hex(16)
+
+        self._held = threading.Event()
+        self._renewed_at = 0.0
+        self._stop_renewing = threading.Event()
+        self._renewer: threading.Thread | None = None
+
+    @property
+    def held(self) -> bool:
+        return self._held.is_set()
+
+    def acquire(self) -> bool:
+        if not self.backend.acquire(self.token, self.ttl):
+            return False
+
+        self._renewed_at = time.monotonic()
+        self._held.set()
+        self._stop_renewing.clear()
+        self._renewer = threading.Thread(target=self._keep_renewing, daemon=True)
+        self._renewer.start()
+        return True
+
+    def _keep_renewing(self) -> None:
+        while not self._stop_renewing.wait(self.ttl / 3):
+            if not self._renew():
+                return
+
+    def _renew(self) -> bool:
+        """
+        Renew the lease once, returning whether it's still worth renewing.
+        """
+        try:
+            renewed = self.backend.renew(self.token, self.ttl)
+        except Exception:
+            logger.exception("Unable to renew run lock")
+
+            if time.monotonic() < self._renewed_at + self.ttl:
+                # The lease is still valid - try again next time
+                return True
+
+            logger.error("Run lock expired - another run may take over")
+            self._held.clear()
+            return False
+
+        if not renewed:
+            logger.error("Run lock was lost - another run may have taken over")
+            self._held.clear()
+            return False
+
+        self._renewed_at = time.monotonic()
+        return True
+
+    def release(self) -> None:
+        self._stop_renewing.set()
+        if self._renewer is not None:
+            self._renewer.join()
+            self._renewer = None
+
+        if self._held.is_set():
+            self._held.clear()
+            self.backend.release(self.token)
+
+
+def get_lease_backend(lock_url: str) -> LeaseBackend:
+    """
+    Get the lease backend for a `$SCALING_LOCK_URL`.
+
+    Redis URLs use a Redis-compatible server (requires the `redis` extra),
+    anything else is treated as a path to a local lock file.
+    """
+    if lock_url.startswith(REDIS_SCHEMES):
+        # Only needed for Redis leases, so imported lazily
+        import redis
+
+        return RedisLeaseBackend(redis.Redis.from_url(lock_url))
+
+    return FileLeaseBackend(lock_url.removeprefix("file://"))
+
+
+def get_run_lock() -> RunLock:
+    lock_url = os.environ.get("SCALING_LOCK_URL") or os.path.join(
+        tempfile.gettempdir(), f"{DEFAULT_LOCK_NAME}.lock"
+    )
+
+    return RunLock(
+        get_lease_backend(lock_url),
+        ttl=float(os.environ.get("SCALING_LOCK_TTL", DEFAULT_LOCK_TTL)),
+    )
@@ -0,0 +1,91 @@
+import logging
+from collections.abc import Callable, Iterable
+from datetime import datetime, timedelta
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger("heroku_scheduled_scaling")
+
+DEFAULT_COOLDOWN = timedelta(minutes=5)
+METRIC_REQUEST_TIMEOUT = 5
+
+
+def read_file_metric(url: str) -> float:
+    return float(Path(urlparse(url).path).read_text().strip())
+
+
+def read_http_metric(url: str) -> float:
+    response = requests.get(url, timeout=METRIC_REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return float(response.text.strip())
+
+
+# Sources of a single numeric metric (eg p95 latency or queue depth), by URL scheme
+METRIC_SOURCES: dict[str, Callable[[str], float]] = {
+    "file": read_file_metric,
+    "http": read_http_metric,
+    "https": read_http_metric,
+}
+
+
+def get_metric(url: str) -> float | None:
+    """
+    Read the current value of a metric, or `None` if it's unavailable.
+    """
+    if (source := METRIC_SOURCES.get(urlparse(url).scheme)) is None:
+        logger.error("Unknown metrics source: %s", url)
+        return None
+
+    try:
+        return source(url)
+    except (OSError, ValueError, requests.RequestException):
+        logger.exception("Unable to read metric from %s", url)
+        return None
+
+
+def get_metrics(urls: Iterable[str]) -> dict[str, float]:
+    """
+    Read the current value of each metric, skipping those which are unavailable.
+    """
+    return {url: value for url in urls if (value := get_metric(url)) is not None}
+
+
+def get_autoscaled_quantity(
+    current: int,
+    minimum: int,
+    maximum: int,
+    value: float | None,
+    scale_up_above: float,
+    scale_down_below: float,
+    last_scaled_at: datetime | None = None,
+    now: datetime | None = None,
+    cooldown: timedelta = DEFAULT_COOLDOWN,
+) -> int:
+    """
+    Get the quantity to scale to, based on a metric.
+
+    The quantity moves by 1 dyno at a time, and stays within `minimum` and
+    `maximum` (from the schedule). Between the 2 thresholds, or within the
+    cooldown after the last scale, the current quantity is kept.
+    """
+    quantity = min(max(current, minimum), maximum)
+
+    if quantity != current or value is None:
+        # Moving into the schedule's bounds takes priority
+        return quantity
+
+    if (
+        last_scaled_at is not None
+        and now is not None
+        and now - last_scaled_at < cooldown
+    ):
+        return quantity
+
+    if value > scale_up_above:
+        return min(quantity + 1, maximum)
+    elif value < scale_down_below:
+        return max(quantity - 1, minimum)
+
+    return quantity
@@ -0,0 +1,117 @@
+import logging
+import re
+import sys
+import threading
+from collections import Counter
+from types import FrameType, TracebackType
+
+logger = logging.getLogger("heroku_scheduled_scaling")
+
+DEFAULT_INTERVAL = 0.01
+DEFAULT_SUMMARY_SIZE = 20
+
+# Thread pool workers are numbered - group them together
+THREAD_NUMBER_RE = re.compile(r"_\d+$")
+
+
+def get_frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+class SamplingProfiler:
+    """
+    A low-overhead profiler, which periodically samples the stack of every thread.
+
+    Unlike `cProfile`, this includes time spent in other threads, and time spent
+    waiting (eg for a connection from the pool, or on the network).
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples: Counter[tuple[str, ...]] = Counter()
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="SamplingProfiler", daemon=True
+        )
+
+    def __enter__(self) -> "SamplingProfiler":
+        self._thread.start()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        thread_names = {
+            thread.ident: THREAD_NUMBER_RE.sub("", thread.name)
+            for thread in threading.enumerate()
+        }
+
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self._thread.ident:
+                continue
+
+            stack = []
+            current: FrameType | None = frame
+            while current is not None:
+                stack.append(get_frame_name(current))
+                current = current.f_back
+
+            stack.append(thread_names.get(thread_id, str(thread_id)))
+            stack.reverse()
+            self.samples[tuple(stack)] += 1
+
+    def collapsed(self) -> str:
+        """
+        Format the samples as collapsed stacks, as used by `flamegraph.pl`,
+        `speedscope` and others.
+        """
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in sorted(self.samples.items())
+        )
+
+    def summary(self, size: int = DEFAULT_SUMMARY_SIZE) -> str:
+        """
+        Summarise the functions with the most samples, both inclusive (the function
+        or anything it calls) and exclusive (the function itself).
+        """
+        if not (total := self.samples.total()):
+            return "No samples"
+
+        inclusive: Counter[str] = Counter()
+        exclusive: Counter[str] = Counter()
+
+        for stack, count in self.samples.items():
+            # Skip the thread name
+            for frame_name in set(stack[1:]):
+                inclusive[frame_name] += count
+            exclusive[stack[-1]] += count
+
+        lines = [
+            f"{total} samples, every {self.interval * 1000:g}ms",
+            "   total     self  function",
+        ]
+        for frame_name, count in inclusive.most_common(size):
+            lines.append(
+                f"{count / total:7.1%} {exclusive[frame_name] / total:7.1%}  {frame_name}"
+            )
+
+        return "\n".join(lines)
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.collapsed())
+
+        logger.info("Profile written to %s\n%s", path, self.summary())
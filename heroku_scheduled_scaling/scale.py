@@ -1,11 +1,19 @@
 import logging
 import os
-from datetime import datetime
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
-from heroku3.models.app import App
-
-from .schedule import parse_schedule
+from .metrics import DEFAULT_COOLDOWN, get_autoscaled_quantity
+from .schedule import (
+    DateRanges,
+    Schedule,
+    get_active_schedule,
+    parse_calendar,
+    parse_schedule,
+)
+from .state import AppState, FormationState
 from .utils import get_zone_info, is_naive
 
 logging.basicConfig()
@@ -14,8 +22,122 @@ logger.setLevel(logging.INFO)
 
 BOOLEAN_TRUE_STRINGS = {"true", "on", "ok", "y", "yes", "1"}
 
+TEMPLATE_PREFIX = "SCHEDULE_TEMPLATE_"
+CALENDAR_PREFIX = "SCHEDULE_CALENDAR_"
+METRICS_URL_KEY = "SCALING_METRICS_URL"
+
+DEFAULT_TIMEZONE = ZoneInfo("UTC")
+
+
+@dataclass(frozen=True, slots=True, eq=True)
+class ProcessScale:
+    quantity: int
+
+    # `None` leaves the dyno size unchanged
+    size: str | None = None
+
+    def as_formation_update(self, process: str) -> dict[str, str | int]:
+        update: dict[str, str | int] = {"type": process, "quantity": self.quantity}
+        if self.size is not None:
+            update["size"] = self.size
+        return update
+
+
+@dataclass(frozen=True, slots=True)
+class ScaleProcess:
+    app: AppState
+    process: str
+    scale: ProcessScale
+
+
+@dataclass(frozen=True, slots=True)
+class SetMaintenanceMode:
+    app: AppState
+    maintenance: bool
+
+
+@dataclass(frozen=True, slots=True)
+class UpdateConfigVars:
+    app: AppState
+
+    # `None` unsets a config var
+    config_vars: dict[str, str | None]
+
+
+Action = ScaleProcess | SetMaintenanceMode | UpdateConfigVars
+
+
+def parse_lead_time(lead_minutes: str) -> timedelta:
+    try:
+        return timedelta(minutes=max(int(lead_minutes), 0))
+    except ValueError:
+        logger.exception("Unable to parse $SCALING_SCHEDULE_LEAD_MINUTES")
+        return timedelta()
+
+
+def get_calendars(environ: Mapping[str, str]) -> dict[str, DateRanges]:
+    """
+    Get the named calendars defined on us
+    """
+    calendars = {}
+
+    for key, value in environ.items():
+        if not key.startswith(CALENDAR_PREFIX):
+            continue
+
+        if (calendar := parse_calendar(value)) is None:
+            logger.error("Unable to parse calendar $%s", key)
+            continue
+
+        calendars[key.removeprefix(CALENDAR_PREFIX)] = calendar
 
-def get_schedule_for_app(app_config: dict[str, str], process: str) -> str | None:
+    return calendars
+
+
+@dataclass(frozen=True, slots=True)
+class PlanContext:
+    """
+    Configuration shared by all apps, rather than set on each app.
+    """
+
+    templates: Mapping[str, str] = field(default_factory=dict)
+    default_timezone: ZoneInfo = DEFAULT_TIMEZONE
+    calendars: Mapping[str, DateRanges] = field(default_factory=dict)
+    default_lead_time: timedelta = timedelta()
+
+    @classmethod
+    def from_environ(cls, environ: Mapping[str, str] | None = None) -> "PlanContext":
+        """
+        Load the configuration defined on us
+        """
+        if environ is None:
+            environ = os.environ
+
+        return cls(
+            templates={
+                key.removeprefix(TEMPLATE_PREFIX): value
+                for key, value in environ.items()
+                if key.startswith(TEMPLATE_PREFIX)
+            },
+            default_timezone=get_zone_info(environ.get("SCALING_SCHEDULE_TIMEZONE", ""))
+            or DEFAULT_TIMEZONE,
+            calendars=get_calendars(environ),
+            default_lead_time=parse_lead_time(
+                environ.get("SCALING_SCHEDULE_LEAD_MINUTES") or "0"
+            ),
+        )
+
+
+def get_process_config(
+    app_config: Mapping[str, str], key: str, process: str
+) -> str | None:
+    """
+    Get a config value for a process, falling back to the value for the app.
+    """
+    return app_config.get(f"{key}_{process.upper()}") or app_config.get(key)
+
+
+def get_schedule_for_app(app_config: Mapping[str, str], process: str) -> str | None:
     if scaling_schedule := app_config.get(f"SCALING_SCHEDULE_{process.upper()}"):
         return scaling_schedule
 
@@ -25,81 +147,260 @@ def get_schedule_for_app(app_config: dict[str, str], process: str) -> str | None
     return None
 
 
-def get_template_schedule(scaling_schedule: str) -> str:
-    if templated_scaling_schedule := os.environ.get(
-        "SCHEDULE_TEMPLATE_" + scaling_schedule
-    ):
-        return get_template_schedule(templated_scaling_schedule)
+def get_template_schedule(scaling_schedule: str, templates: Mapping[str, str]) -> str:
+    if templated_scaling_schedule := templates.get(scaling_schedule):
+        return get_template_schedule(templated_scaling_schedule, templates)
 
     return scaling_schedule
 
 
-def get_timezone_for_app(app_config: dict) -> ZoneInfo:
+def get_timezone_for_app(
+    app_config: Mapping[str, str], default_timezone: ZoneInfo = DEFAULT_TIMEZONE
+) -> ZoneInfo:
     """
-    Get timezone from app, then from us, falling back to UTC
+    Get timezone from app, falling back to the default
     """
     if app_timezone := get_zone_info(app_config.get("SCALING_SCHEDULE_TIMEZONE", "")):
         return app_timezone
 
-    elif default_timezone := get_zone_info(
-        os.environ.get("SCALING_SCHEDULE_TIMEZONE", "")
+    return default_timezone
+
+
+def get_lead_time_for_app(
+    app_config: Mapping[str, str], process: str, default: timedelta = timedelta()
+) -> timedelta:
+    """
+    Get how far ahead of a schedule boundary to apply scale-ups, from the process,
+    then the app, falling back to the default.
+    """
+    if not (
+        lead_minutes := get_process_config(
+            app_config, "SCALING_SCHEDULE_LEAD_MINUTES", process
+        )
     ):
-        return default_timezone
+        return default
 
-    return ZoneInfo("UTC")
+    return parse_lead_time(lead_minutes)
 
 
-def get_scale_for_app(app: App, process: str = "web") -> int | None:
+def get_step_for_app(app_config: Mapping[str, str], process: str) -> int | None:
     """
-    Get the expected scale for an app.
+    Get the most dynos a process may be scaled up by in a single run.
 
-    `None` signifies "Don't change anything".
+    `None` signifies no limit.
     """
-    if process == "release":
+    if not (step := get_process_config(app_config, "SCALING_SCHEDULE_STEP", process)):
+        return None
+
+    try:
+        return max(int(step), 1)
+    except ValueError:
+        logger.exception("Unable to parse $SCALING_SCHEDULE_STEP")
         return None
 
-    config = app.config()
 
-    # Also grab as dict, as `ConfigVars` doesn't implement `.get`
-    config_dict = config.to_dict()
+def get_metrics_urls(app_config: Mapping[str, str]) -> set[str]:
+    """
+    Get the URLs of all the metrics used to autoscale an app
+    """
+    return {
+        value
+        for key, value in app_config.items()
+        if key == METRICS_URL_KEY or key.startswith(f"{METRICS_URL_KEY}_")
+    }
 
-    timezone = get_timezone_for_app(config_dict)
-    now = datetime.now().astimezone(timezone)
 
-    if not (scaling_schedule := get_schedule_for_app(config_dict, process)):
-        # No schedule
-        return None
+def get_autoscaled_scale_for_app(
+    app_config: Mapping[str, str],
+    process: str,
+    minimum: int,
+    maximum: int,
+    formation: FormationState,
+    now: datetime,
+    metrics: Mapping[str, float],
+) -> int:
+    """
+    Get the scale within a schedule's bounds, based on the process's metric.
+
+    Without a metric configured, the minimum is used.
+    """
+    if not (metrics_url := get_process_config(app_config, METRICS_URL_KEY, process)):
+        return minimum
+
+    scale_up_above = get_process_config(
+        app_config, "SCALING_METRICS_SCALE_UP_ABOVE", process
+    )
+    scale_down_below = get_process_config(
+        app_config, "SCALING_METRICS_SCALE_DOWN_BELOW", process
+    )
+    cooldown_minutes = get_process_config(
+        app_config, "SCALING_METRICS_COOLDOWN_MINUTES", process
+    )
+
+    if scale_up_above is None or scale_down_below is None:
+        logger.error(
+            "Autoscaling requires $SCALING_METRICS_SCALE_UP_ABOVE and $SCALING_METRICS_SCALE_DOWN_BELOW"
+        )
+        return minimum
+
+    try:
+        thresholds = (float(scale_up_above), float(scale_down_below))
+        cooldown = (
+            timedelta(minutes=float(cooldown_minutes))
+            if cooldown_minutes
+            else DEFAULT_COOLDOWN
+        )
+    except ValueError:
+        logger.exception("Unable to parse autoscaling configuration")
+        return minimum
+
+    if thresholds[1] >= thresholds[0]:
+        logger.error(
+            "$SCALING_METRICS_SCALE_DOWN_BELOW must be lower than $SCALING_METRICS_SCALE_UP_ABOVE"
+        )
+        return minimum
+
+    return get_autoscaled_quantity(
+        formation.quantity,
+        minimum,
+        maximum,
+        metrics.get(metrics_url),
+        *thresholds,
+        last_scaled_at=formation.updated_at,
+        now=now,
+        cooldown=cooldown,
+    )
+
+
+def is_scaling_disabled(app_config: Mapping[str, str], now: datetime) -> bool:
+    """
+    Determine whether scaling is (temporarily) disabled for an app.
 
-    scaling_disabled = config_dict.get("SCALING_SCHEDULE_DISABLE", "")
-    if scaling_disabled:
-        if scaling_disabled.lower() in BOOLEAN_TRUE_STRINGS:
-            # Scheduling temporarily disabled - don't do anything
-            return None
+    `now` should be in the app's timezone, which is assumed for naive timestamps.
+    """
+    if not (scaling_disabled := app_config.get("SCALING_SCHEDULE_DISABLE", "")):
+        return False
+
+    if scaling_disabled.lower() in BOOLEAN_TRUE_STRINGS:
+        # Scheduling temporarily disabled - don't do anything
+        return True
+
+    try:
+        disabled_until_date = datetime.fromisoformat(scaling_disabled)
+    except ValueError:
+        logger.exception("Unable to parse $SCALING_SCHEDULE_DISABLE")
+        return True  # err on the side of caution - do nothing.
+
+    # If the disabled date is naive, assume it's in the timezone of the app
+    if is_naive(disabled_until_date):
+        disabled_until_date = disabled_until_date.replace(tzinfo=now.tzinfo)
+
+    return disabled_until_date > now
+
+
+def get_schedule_scale_for_app(
+    app_config: Mapping[str, str],
+    process: str,
+    schedule: Schedule,
+    formation: FormationState | None,
+    now: datetime,
+    metrics: Mapping[str, float],
+) -> int:
+    """
+    Get the scale for a schedule, autoscaling it if the process is running.
+    """
+    if schedule.max_scale is None or formation is None:
+        return schedule.scale
+
+    return get_autoscaled_scale_for_app(
+        app_config,
+        process,
+        schedule.scale,
+        schedule.max_scale,
+        formation,
+        now,
+        metrics,
+    )
 
-        try:
-            disabled_until_date = datetime.fromisoformat(scaling_disabled)
-        except ValueError:
-            logger.exception("Unable to parse $SCALING_SCHEDULE_DISABLE")
-            return None  # err on the side of caution - do nothing.
 
-        # If the disabled date is naive, assume it's in the timezone of the app
-        if is_naive(disabled_until_date):
-            disabled_until_date = disabled_until_date.replace(tzinfo=timezone)
+def get_process_scale_for_app(
+    app: AppState,
+    process: str,
+    now: datetime,
+    context: PlanContext,
+    metrics: Mapping[str, float] | None = None,
+) -> ProcessScale | None:
+    """
+    Get the expected scale (and dyno size) for an app's process.
+
+    If the process is running, schedules with a maximum scale are autoscaled based
+    on its metric, and scale ups are limited to the process's step, so larger scale
+    ups are ramped up over multiple runs.
+
+    `None` signifies "Don't change anything".
+    """
+    if process == "release":
+        return None
+
+    config_dict = app.schedule_vars
 
-        if disabled_until_date > now:
-            # Still temporarily disabled
-            return None
+    if not (scaling_schedule := get_schedule_for_app(config_dict, process)):
+        # No schedule
+        return None
 
-        if disabled_until_date <= now:
-            # Unset the expired schedule
-            config.update({"SCALING_SCHEDULE_DISABLE": None})
+    now = now.astimezone(get_timezone_for_app(config_dict, context.default_timezone))
 
     # If the schedule is a template, resolve it
-    scaling_schedule = get_template_schedule(scaling_schedule)
+    scaling_schedule = get_template_schedule(scaling_schedule, context.templates)
+    schedules = parse_schedule(scaling_schedule)
+
+    # Undefined calendars never apply, so a typo would otherwise go unnoticed
+    for calendar in sorted(
+        {schedule.calendar for schedule in schedules if schedule.calendar}
+        - context.calendars.keys()
+    ):
+        logger.error(
+            "Schedule for %s (%s) uses an undefined calendar: %s",
+            app.name,
+            process,
+            calendar,
+        )
+
+    if (
+        schedule := get_active_schedule(schedules, now, calendars=context.calendars)
+    ) is not None:
+        formation = app.formations.get(process)
+        scale = get_schedule_scale_for_app(
+            config_dict, process, schedule, formation, now, metrics or {}
+        )
+
+        upcoming = get_active_schedule(
+            schedules,
+            now,
+            get_lead_time_for_app(config_dict, process, context.default_lead_time),
+            context.calendars,
+            None if formation is None else formation.size,
+        )
+
+        # Only bring the upcoming schedule forward if it scales up from the current
+        # target, which may have been autoscaled above the schedule's minimum
+        if upcoming is not None and upcoming != schedule and upcoming.scale > scale:
+            schedule = upcoming
+            scale = get_schedule_scale_for_app(
+                config_dict, process, schedule, formation, now, metrics or {}
+            )
+
+        if (
+            formation is not None
+            and (step := get_step_for_app(config_dict, process)) is not None
+            and scale > formation.quantity + step
+        ):
+            logger.info(
+                "Ramping app %s (%s) towards %d dynos", app.name, process, scale
+            )
+            scale = formation.quantity + step
 
-    for schedule in parse_schedule(scaling_schedule):
-        if schedule.covers(now):
-            return schedule.scale
+        return ProcessScale(scale, schedule.size)
 
     logger.error(
         "Unable to apply schedule for %s (%s): %s. Does it define a schedule for the current time?",
@@ -111,37 +412,71 @@ def get_scale_for_app(app: App, process: str = "web") -> int | None:
     return None
 
 
-def scale_app(app: App) -> None:
-    formations = app.process_formation()
+def plan_app(
+    app: AppState,
+    now: datetime,
+    context: PlanContext,
+    metrics: Mapping[str, float] | None = None,
+) -> list[Action]:
+    app_now = now.astimezone(
+        get_timezone_for_app(app.schedule_vars, context.default_timezone)
+    )
+    if is_scaling_disabled(app.schedule_vars, app_now):
+        return []
 
     process_scales = {
-        formation.type: scale
-        for formation in formations
-        if (scale := get_scale_for_app(app, formation.type)) is not None
+        process: process_scale
+        for process in app.formations
+        if (
+            process_scale := get_process_scale_for_app(
+                app, process, now, context, metrics
+            )
+        )
+        is not None
     }
 
-    if not process_scales:
-        return
+    actions: list[Action] = []
 
-    for process, scale in process_scales.items():
-        if formations[process].quantity != scale:
-            logger.info(
-                "Scaling app %s (%s) to %d dynos (from %d)",
-                app.name,
-                process,
-                scale,
-                formations[process].quantity,
-            )
+    if app.schedule_vars.get("SCALING_SCHEDULE_DISABLE") and any(
+        get_schedule_for_app(app.schedule_vars, process)
+        for process in app.formations
+        if process != "release"
+    ):
+        # Unset the expired schedule, even if it doesn't cover the current time
+        actions.append(UpdateConfigVars(app, {"SCALING_SCHEDULE_DISABLE": None}))
+
+    actions.extend(
+        ScaleProcess(app, process, process_scale)
+        for process, process_scale in process_scales.items()
+    )
 
-    app.batch_scale_formation_processes(process_scales)
+    if (web_process_scale := process_scales.get("web")) is not None:
+        web_scale = web_process_scale.quantity
 
-    if (web_scale := process_scales.get("web")) is not None:
         # For a better experience, enable maintenance mode for apps scaled to 0
         if web_scale == 0 and not app.maintenance:
-            logger.info("Enabling maintenance mode for %s", app.name)
-            app.enable_maintenance_mode()
+            actions.append(SetMaintenanceMode(app, True))
         elif web_scale and app.maintenance:
             # NOTE: This can result in maintenance mode being disabled unexpectedly, but
             # this will only happen on scaling boundaries.
-            logger.info("Disabling maintenance mode for %s", app.name)
-            app.disable_maintenance_mode()
+            actions.append(SetMaintenanceMode(app, False))
+
+    return actions
+
+
+def plan(
+    app_states: Iterable[AppState],
+    now: datetime,
+    context: PlanContext,
+    metrics: Mapping[str, float] | None = None,
+) -> list[Action]:
+    """
+    Plan the actions needed to bring apps in line with their schedules.
+
+    This makes no requests, and only reads configuration from `context`, so it can
+    be used to evaluate schedules without applying them. `metrics` are the current
+    values of the metrics used for autoscaling, by URL.
+    """
+    return [
+        action for app in app_states for action in plan_app(app, now, context, metrics)
+    ]
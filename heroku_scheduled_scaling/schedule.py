@@ -1,11 +1,76 @@
+import string
+from bisect import bisect_right
+from collections.abc import Iterable, Mapping
 from dataclasses import dataclass
-from datetime import datetime, time
+from datetime import UTC, date, datetime, time, timedelta
 from functools import cache
 
 import pyparsing
 
 WEEKDAYS = "0123456"
 DELIMITER = ";"
+SIZE_DELIMITER = "@"
+DATE_RANGE_DELIMITER = ".."
+
+# Schedules have minute precision, and end times are inclusive
+SCHEDULE_RESOLUTION = timedelta(minutes=1)
+
+# Dyno sizes, ranked by memory, so changes in size can be compared
+DYNO_SIZE_RANKS = {
+    "eco": 0,
+    "basic": 1,
+    "standard-1x": 2,
+    "standard-2x": 3,
+    "private-s": 3,
+    "shield-s": 3,
+    "performance-m": 4,
+    "private-m": 4,
+    "shield-m": 4,
+    "performance-l": 5,
+    "private-l": 5,
+    "shield-l": 5,
+    "performance-l-ram": 6,
+    "private-l-ram": 6,
+    "shield-l-ram": 6,
+    "performance-xl": 7,
+    "private-xl": 7,
+    "shield-xl": 7,
+    "performance-2xl": 8,
+    "private-2xl": 8,
+    "shield-2xl": 8,
+}
+
+
+@dataclass(frozen=True, slots=True, eq=True)
+class DateRanges:
+    """
+    A set of date ranges, merged and sorted so checking whether it contains a
+    date is a bisect rather than a scan.
+    """
+
+    starts: tuple[date, ...] = ()
+    ends: tuple[date, ...] = ()
+
+    @classmethod
+    def from_ranges(cls, ranges: Iterable[tuple[date, date]]) -> "DateRanges":
+        merged: list[tuple[date, date]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + timedelta(days=1):
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+
+        return cls(
+            starts=tuple(start for start, _ in merged),
+            ends=tuple(end for _, end in merged),
+        )
+
+    def __contains__(self, value: object) -> bool:
+        if not isinstance(value, date):
+            return False
+
+        index = bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
 
 
 @dataclass(frozen=True, slots=True, eq=True)
@@ -17,10 +82,45 @@ class Schedule:
     start_day: int = 0
     end_day: int = 6
 
-    def covers(self, current: datetime) -> bool:
+    # Dyno size (eg `standard-1x`). `None` leaves the size unchanged.
+    size: str | None = None
+
+    # Upper bound for autoscaling, with `scale` as the lower bound.
+    # `None` disables autoscaling.
+    max_scale: int | None = None
+
+    # Restrict the schedule to a range of dates, or the dates in a named calendar
+    start_date: date | None = None
+    end_date: date | None = None
+    calendar: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.max_scale is not None and self.max_scale < self.scale:
+            raise ValueError("Maximum scale must not be lower than the scale")
+
+        if (
+            self.start_date is not None
+            and self.end_date is not None
+            and self.end_date < self.start_date
+        ):
+            raise ValueError("End date must not be before the start date")
+
+    def covers(
+        self, current: datetime, calendars: Mapping[str, DateRanges] | None = None
+    ) -> bool:
         if self.start_day < current.weekday() > self.end_day:
             return False
 
+        if self.start_date is not None and not (
+            self.start_date <= current.date() <= (self.end_date or self.start_date)
+        ):
+            return False
+
+        if self.calendar is not None and current.date() not in (calendars or {}).get(
+            self.calendar, DateRanges()
+        ):
+            return False
+
         current_time = current.time()
         if self.start_time < self.end_time:
             return current_time >= self.start_time and current_time <= self.end_time
@@ -28,13 +128,55 @@ class Schedule:
             return current_time >= self.start_time or current_time <= self.end_time
 
     def serialize(self) -> str:
-        return f"{self.start_day}-{self.end_day}({self.start_time.strftime('%H%M')}-{self.end_time.strftime('%H%M')}:{self.scale})"
+        max_scale = f"-{self.max_scale}" if self.max_scale is not None else ""
+        size = f"{SIZE_DELIMITER}{self.size}" if self.size else ""
+
+        if self.calendar is not None:
+            days = self.calendar
+        elif self.start_date is not None:
+            days = f"{self.start_date.isoformat()}{DATE_RANGE_DELIMITER}{(self.end_date or self.start_date).isoformat()}"
+        else:
+            days = f"{self.start_day}-{self.end_day}"
+
+        return f"{days}({self.start_time.strftime('%H%M')}-{self.end_time.strftime('%H%M')}:{self.scale}{max_scale}{size})"
 
 
 def parse_time(val: str) -> time:
     return datetime.strptime(val, "%H%M").time()
 
 
+def parse_max_scale(entry: dict) -> int | None:
+    return int(max_scale) if (max_scale := entry.get("max_scale")) else None
+
+
+def parse_days(match: dict) -> dict:
+    """
+    Get the `Schedule` arguments for which days a set of schedule entries applies
+    """
+    if calendar := match.get("calendar"):
+        return {"calendar": calendar}
+
+    if start_date := match.get("start_date"):
+        return {
+            "start_date": date.fromisoformat(start_date),
+            "end_date": date.fromisoformat(match.get("end_date", start_date)),
+        }
+
+    return {
+        "start_day": int(match["start_day"]),
+        "end_day": int(match.get("end_day", match["start_day"])),
+    }
+
+
+def get_date_range_format() -> pyparsing.ParserElement:
+    date_format = pyparsing.Regex(r"\d{4}-\d{2}-\d{2}")
+
+    return date_format.setResultsName("start_date") + pyparsing.Optional(
+        pyparsing.Suppress(DATE_RANGE_DELIMITER)
+        + date_format.setResultsName("end_date")
+    )
+
+
 def get_schedule_format() -> pyparsing.ParserElement:
     """
     Get the `pyparsing` definition for a schedule set
@@ -45,14 +187,27 @@ def get_schedule_format() -> pyparsing.ParserElement:
     ) + pyparsing.Optional(
         pyparsing.Suppress("-") + pyparsing.Char(WEEKDAYS).setResultsName("end_day")
     )
+    calendar = pyparsing.Word(
+        string.ascii_uppercase, string.ascii_uppercase + string.digits + "_"
+    ).setResultsName("calendar")
+    days = pyparsing.Or([day_range, get_date_range_format(), calendar])
 
     time_range = (
         pyparsing.Word(pyparsing.nums, exact=4).setResultsName("start_time")
         + pyparsing.Suppress("-")
         + pyparsing.Word(pyparsing.nums, exact=4).setResultsName("end_time")
     )
-    scale = pyparsing.Word(pyparsing.nums).setResultsName("scale")
-    schedule_entry = pyparsing.Group(time_range + pyparsing.Suppress(":") + scale)
+    scale = pyparsing.Word(pyparsing.nums).setResultsName("scale") + pyparsing.Optional(
+        pyparsing.Suppress("-")
+        + pyparsing.Word(pyparsing.nums).setResultsName("max_scale")
+    )
+    size = pyparsing.Optional(
+        pyparsing.Suppress(SIZE_DELIMITER)
+        + pyparsing.Word(pyparsing.alphanums + "-").setResultsName("size")
+    )
+    schedule_entry = pyparsing.Group(
+        time_range + pyparsing.Suppress(":") + scale + size
+    )
 
     schedule_entries = pyparsing.delimitedList(
         schedule_entry, delim=DELIMITER
@@ -63,7 +218,7 @@ def get_schedule_format() -> pyparsing.ParserElement:
             [
                 schedule_entry,
                 pyparsing.Group(
-                    day_range
+                    days
                     + pyparsing.Suppress("(")
                     + schedule_entries
                     + pyparsing.Suppress(")")
@@ -75,6 +230,9 @@ def get_schedule_format() -> pyparsing.ParserElement:
 
 
 SCHEDULE_PARSER = get_schedule_format()
+CALENDAR_PARSER = pyparsing.delimitedList(
+    pyparsing.Group(get_date_range_format()), delim=DELIMITER
+)
 
 
 @cache
@@ -98,8 +256,9 @@ def parse_schedule(schedule_str: str) -> list[Schedule]:
                             start_time=parse_time(entry["start_time"]),
                             end_time=parse_time(entry["end_time"]),
                             scale=int(entry["scale"]),
-                            start_day=int(match["start_day"]),
-                            end_day=int(match.get("end_day", match["start_day"])),
+                            size=entry.get("size"),
+                            max_scale=parse_max_scale(entry),
+                            **parse_days(match),
                         )
                     )
                 except ValueError:
@@ -111,9 +270,117 @@ def parse_schedule(schedule_str: str) -> list[Schedule]:
                         start_time=parse_time(match["start_time"]),
                         end_time=parse_time(match["end_time"]),
                         scale=int(match["scale"]),
+                        size=match.get("size"),
+                        max_scale=parse_max_scale(match),
                     )
                 )
             except ValueError:
                 pass
 
     return schedules
+
+
+@cache
+def parse_calendar(calendar_str: str) -> DateRanges | None:
+    """
+    Parse a calendar of dates and date ranges (eg `2025-12-25;2025-12-31..2026-01-01`).
+
+    Returns `None` if the calendar is invalid.
+    """
+    try:
+        parsed_results = CALENDAR_PARSER.parseString(calendar_str, parseAll=True)
+    except pyparsing.exceptions.ParseException:
+        return None
+
+    date_ranges = []
+    for match in parsed_results:
+        try:
+            days = parse_days(match.as_dict())
+        except ValueError:
+            return None
+
+        if days["end_date"] < days["start_date"]:
+            return None
+
+        date_ranges.append((days["start_date"], days["end_date"]))
+
+    return DateRanges.from_ranges(date_ranges)
+
+
+def as_utc(current: datetime) -> datetime:
+    """
+    Convert a datetime to UTC, so it can be compared by elapsed time (comparisons
+    within a single timezone ignore DST offsets).
+    """
+    return current if current.tzinfo is None else current.astimezone(UTC)
+
+
+def is_downsize(current: str | None, upcoming: str | None) -> bool:
+    """
+    Determine whether changing dyno size may make dynos smaller.
+
+    Changes between unknown sizes are assumed to.
+    """
+    if current is None or upcoming is None or current.lower() == upcoming.lower():
+        return False
+
+    current_rank = DYNO_SIZE_RANKS.get(current.lower())
+    upcoming_rank = DYNO_SIZE_RANKS.get(upcoming.lower())
+
+    return current_rank is None or upcoming_rank is None or upcoming_rank < current_rank
+
+
+def get_active_schedule(
+    schedules: list[Schedule],
+    current: datetime,
+    lead_time: timedelta = timedelta(),
+    calendars: Mapping[str, DateRanges] | None = None,
+    current_size: str | None = None,
+) -> Schedule | None:
+    """
+    Get the schedule which applies at `current` (the first which covers it).
+
+    With a `lead_time`, scale-ups starting within that time are brought forward
+    to now, whilst scale-downs (and downsizes) still happen on time. Schedules
+    without a size are compared against the process's `current_size`.
+    """
+    active = next((s for s in schedules if s.covers(current, calendars)), None)
+
+    if active is None or lead_time <= timedelta():
+        return active
+
+    until = as_utc(current) + lead_time
+    if current.tzinfo is not None:
+        until = until.astimezone(current.tzinfo)
+
+    # The active schedule only changes when a rule starts, just after one ends
+    # (uncovering a later rule), or when the day changes, so those are the only
+    # times worth checking.
+    day = current.date()
+    while day <= until.date():
+        boundaries = {datetime.combine(day, time.min, current.tzinfo)}
+        for schedule in schedules:
+            boundaries.add(datetime.combine(day, schedule.start_time, current.tzinfo))
+            boundaries.add(
+                datetime.combine(day, schedule.end_time, current.tzinfo)
+                + SCHEDULE_RESOLUTION
+            )
+
+        # Check boundaries in time order, as each may change the active schedule
+        for boundary in sorted(boundaries, key=as_utc):
+            if not as_utc(current) < as_utc(boundary) <= as_utc(until):
+                continue
+
+            upcoming = next(
+                (s for s in schedules if s.covers(boundary, calendars)), None
+            )
+            if (
+                upcoming is not None
+                and upcoming.scale > active.scale
+                and not is_downsize(active.size or current_size, upcoming.size)
+            ):
+                active = upcoming
+
+        day += timedelta(days=1)
+
+    return active
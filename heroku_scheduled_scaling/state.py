@@ -0,0 +1,60 @@
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import datetime
+
+# Only config vars used for scaling are kept
+SCHEDULE_VAR_PREFIX = "SCALING_"
+
+
+@dataclass(slots=True)
+class FormationState:
+    type: str
+    quantity: int
+    size: str
+    updated_at: datetime | None = None
+
+    @classmethod
+    def from_json(cls, data: dict) -> "FormationState":
+        return cls(
+            type=data["type"],
+            quantity=data["quantity"],
+            size=data["size"],
+            updated_at=(
+                datetime.fromisoformat(updated_at)
+                if (updated_at := data.get("updated_at"))
+                else None
+            ),
+        )
+
+
+@dataclass(slots=True)
+class AppState:
+    """
+    The parts of an app used for scaling.
+
+    Apps are listed without their formations or config, which are loaded
+    separately when the app is scaled.
+    """
+
+    id: str
+    name: str
+    maintenance: bool
+    formations: dict[str, FormationState] = field(default_factory=dict)
+    schedule_vars: dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_json(cls, data: dict) -> "AppState":
+        return cls(id=data["id"], name=data["name"], maintenance=data["maintenance"])
+
+    def load_formations(self, formations: list[dict]) -> None:
+        self.formations = {
+            formation["type"]: FormationState.from_json(formation)
+            for formation in formations
+        }
+
+    def load_config_vars(self, config_vars: Mapping[str, str | None]) -> None:
+        self.schedule_vars = {
+            key: value
+            for key, value in config_vars.items()
+            if key.startswith(SCHEDULE_VAR_PREFIX) and value is not None
+        }
@@ -1,34 +1,87 @@
 import os
 import zoneinfo
 from datetime import datetime
-from typing import Iterable
+from typing import Any, Iterable
 
 import heroku3
-from heroku3.models.app import App
 
+from .state import AppState
 
-def get_apps_for_teams(heroku: heroku3.core.Heroku, teams: list[str]) -> Iterable[App]:
+# NOTE: Requests are made directly (rather than through `heroku3`'s models), so
+# only the fields needed for scaling are kept, rather than every model, its
+# session reference and nested models.
+
+
+def get_data(heroku: heroku3.core.Heroku, resource: tuple[str, ...]) -> Any:
+    return heroku._get_data(resource)  # type:ignore[attr-defined]
+
+
+def update_data(
+    heroku: heroku3.core.Heroku, resource: tuple[str, ...], data: dict
+) -> None:
+    response = heroku._http_resource(  # type:ignore[attr-defined]
+        method="PATCH",
+        resource=resource,
+        data=heroku._resource_serialize(data),  # type:ignore[attr-defined]
+    )
+    response.raise_for_status()
+
+
+def get_apps_for_teams(
+    heroku: heroku3.core.Heroku, teams: list[str]
+) -> Iterable[AppState]:
     for team in teams:
-        yield from heroku._get_resources(  # type:ignore[attr-defined]
-            ("teams", team, "apps"), App
-        )
+        for app in get_data(heroku, ("teams", team, "apps")):
+            yield AppState.from_json(app)
 
 
 def get_heroku_client() -> heroku3.core.Heroku:
     return heroku3.from_key(os.environ["HEROKU_API_KEY"])
 
 
-def get_heroku_apps() -> list[App]:
-    heroku = get_heroku_client()
-
+def get_heroku_apps(heroku: heroku3.core.Heroku) -> list[AppState]:
     heroku_teams = os.environ.get("HEROKU_TEAMS", "").split(",")
     return (
-        heroku.apps()
+        [AppState.from_json(app) for app in get_data(heroku, ("apps",))]
         if heroku_teams is None
         else list(get_apps_for_teams(heroku, heroku_teams))
     )
 
 
+def load_app_state(heroku: heroku3.core.Heroku, app: AppState) -> None:
+    """
+    Load the formations and config vars for an app.
+    """
+    app.load_formations(get_data(heroku, ("apps", app.id, "formation")))
+    app.load_config_vars(get_data(heroku, ("apps", app.id, "config-vars")))
+
+
+def batch_update_formation_processes(
+    heroku: heroku3.core.Heroku, app: AppState, updates: list[dict[str, str | int]]
+) -> None:
+    """
+    Update the quantity and size of multiple processes in a single request.
+    """
+    update_data(heroku, ("apps", app.id, "formation"), {"updates": updates})
+
+
+def update_config_vars(
+    heroku: heroku3.core.Heroku, app: AppState, config_vars: dict[str, str | None]
+) -> None:
+    """
+    Update an app's config vars. `None` unsets a config var.
+    """
+    update_data(heroku, ("apps", app.id, "config-vars"), config_vars)
+    app.load_config_vars({**app.schedule_vars, **config_vars})
+
+
+def set_maintenance_mode(
+    heroku: heroku3.core.Heroku, app: AppState, maintenance: bool
+) -> None:
+    update_data(heroku, ("apps", app.id), {"maintenance": maintenance})
+    app.maintenance = maintenance
+
+
 def get_zone_info(key: str) -> zoneinfo.ZoneInfo | None:
     """
     Attempt to retrive the `ZoneInfo` for a given timezone, or `None`
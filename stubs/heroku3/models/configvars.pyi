@@ -1,3 +0,0 @@
-class ConfigVars:
-    def to_dict(self) -> dict[str, str]: ...
-    def update(self, updates: dict[str, str | None]) -> None: ...
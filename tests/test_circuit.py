@@ -0,0 +1,187 @@
+import time
+
+import pytest
+import requests
+
+from heroku_scheduled_scaling.circuit import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    is_api_degraded,
+)
+
+
+def succeed() -> str:
+    return "ok"
+
+
+def fail() -> str:
+    raise requests.ConnectionError("API unavailable")
+
+
+def fail_with_status(status_code: int) -> str:
+    response = requests.Response()
+    response.status_code = status_code
+    raise requests.HTTPError(response=response)
+
+
+def test_closed_circuit_passes_calls() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=3)
+
+    assert circuit_breaker.call(succeed) == "ok"
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    assert circuit_breaker.call(succeed) == "ok"
+
+    assert circuit_breaker.state == CircuitState.CLOSED
+    assert not circuit_breaker.tripped
+
+
+def test_trips_on_error_rate() -> None:
+    circuit_breaker = CircuitBreaker(failure_threshold=0.5, min_calls=4)
+
+    circuit_breaker.call(succeed)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            circuit_breaker.call(fail)
+
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+    assert circuit_breaker.tripped
+
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.call(succeed)
+
+
+def test_trips_on_slow_calls() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=2, slow_call_duration=0.01)
+
+    for _ in range(2):
+        circuit_breaker.call(time.sleep, 0.02)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+
+
+def test_half_open_probe_closes() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.call(succeed)
+
+    time.sleep(0.02)
+
+    assert circuit_breaker.call(succeed) == "ok"
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+    # The run is still reported as degraded
+    assert circuit_breaker.tripped
+
+
+def test_half_open_probe_reopens() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    time.sleep(0.02)
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    assert circuit_breaker.state == CircuitState.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.call(succeed)
+
+
+def test_half_open_allows_single_probe() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    time.sleep(0.02)
+
+    def probe() -> str:
+        # Whilst the probe is in flight, other calls are still rejected
+        with pytest.raises(CircuitOpenError):
+            circuit_breaker.call(succeed)
+        return "probed"
+
+    assert circuit_breaker.call(probe) == "probed"
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+
+def test_time_until_half_open() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1, reset_timeout=30)
+
+    assert circuit_breaker.time_until_half_open() == 0
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    assert 29 < circuit_breaker.time_until_half_open() <= 30
+
+    circuit_breaker.reset_timeout = 0
+    assert circuit_breaker.time_until_half_open() == 0
+
+
+def test_ignores_client_errors() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1)
+
+    with pytest.raises(requests.HTTPError):
+        circuit_breaker.call(fail_with_status, 422)
+    with pytest.raises(ValueError):
+        circuit_breaker.call(int, "not a number")
+
+    assert circuit_breaker.state == CircuitState.CLOSED
+    assert not circuit_breaker.tripped
+
+
+def test_half_open_probe_client_error() -> None:
+    circuit_breaker = CircuitBreaker(min_calls=1, reset_timeout=0.01)
+
+    with pytest.raises(requests.ConnectionError):
+        circuit_breaker.call(fail)
+
+    time.sleep(0.02)
+
+    with pytest.raises(requests.HTTPError):
+        circuit_breaker.call(fail_with_status, 404)
+
+    # Another probe is let through
+    assert circuit_breaker.state == CircuitState.HALF_OPEN
+    assert circuit_breaker.call(succeed) == "ok"
+    assert circuit_breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.parametrize(
+    "exception,expected",
+    [
+        (requests.ConnectionError(), True),
+        (requests.Timeout(), True),
+        (requests.HTTPError(response=None), False),
+        (ValueError(), False),
+    ],
+)
+def test_is_api_degraded(exception: Exception, expected: bool) -> None:
+    assert is_api_degraded(exception) is expected
+
+
+@pytest.mark.parametrize(
+    "status_code,expected", [(429, True), (500, True), (503, True), (404, False)]
+)
+def test_is_api_degraded_status(status_code: int, expected: bool) -> None:
+    with pytest.raises(requests.HTTPError) as e:
+        fail_with_status(status_code)
+
+    assert is_api_degraded(e.value) is expected
@@ -0,0 +1,307 @@
+import json
+from datetime import datetime, time
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+from zoneinfo import ZoneInfo
+
+import time_machine
+
+from heroku_scheduled_scaling.execute import apply_actions, scale_app
+from heroku_scheduled_scaling.scale import (
+    ProcessScale,
+    ScaleProcess,
+    SetMaintenanceMode,
+    UpdateConfigVars,
+)
+from heroku_scheduled_scaling.state import AppState, FormationState
+
+UTC = ZoneInfo("UTC")
+
+
+def now_time(time_component: time) -> datetime:
+    return datetime.combine(datetime.now().date(), time_component).replace(tzinfo=UTC)
+
+
+def formation_json(process: str, quantity: int, size: str = "Standard-1X") -> dict:
+    return {"type": process, "quantity": quantity, "size": size, "updated_at": None}
+
+
+def make_app(maintenance: bool = False) -> AppState:
+    return AppState(id="app-id", name="app", maintenance=maintenance)
+
+
+def make_heroku(
+    config_vars: dict[str, str] | None = None, formations: list[dict] | None = None
+) -> MagicMock:
+    """
+    Create a Heroku client, returning the given config vars and formations
+    """
+    heroku = MagicMock()
+    heroku._resource_serialize.side_effect = json.dumps
+    heroku._get_data.side_effect = lambda resource: {
+        "config-vars": config_vars or {},
+        "formation": formations or [],
+    }[resource[-1]]
+    return heroku
+
+
+def get_updates(heroku: MagicMock) -> list[tuple[tuple[str, ...], Any]]:
+    return [
+        (call.kwargs["resource"], json.loads(call.kwargs["data"]))
+        for call in heroku._http_resource.call_args_list
+    ]
+
+
+def test_does_nothing_when_matching_schedule() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:2"}, [formation_json("web", 2)]
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "formation"), {"updates": [{"type": "web", "quantity": 2}]})
+    ]
+
+
+def test_loads_app_state() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:2", "DATABASE_URL": "postgres://"},
+        [formation_json("web", 2)],
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    # Only config used for scaling is kept
+    assert app.schedule_vars == {"SCALING_SCHEDULE": "0900-1700:2"}
+    assert app.formations == {"web": FormationState("web", 2, "Standard-1X")}
+
+
+def test_scales_app() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:2"}, [formation_json("web", 1)]
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "formation"), {"updates": [{"type": "web", "quantity": 2}]})
+    ]
+
+
+def test_enables_maintenance_mode() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:0"}, [formation_json("web", 1)]
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 0}]},
+        ),
+        (("apps", "app-id"), {"maintenance": True}),
+    ]
+    assert app.maintenance
+
+
+def test_disables_maintenance_mode() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:1"}, [formation_json("web", 0)]
+    )
+    app = make_app(maintenance=True)
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 1}]},
+        ),
+        (("apps", "app-id"), {"maintenance": False}),
+    ]
+    assert not app.maintenance
+
+
+def test_ramps_scale_up() -> None:
+    formations = [formation_json("web", 0)]
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:8", "SCALING_SCHEDULE_STEP_WEB": "3"},
+        formations,
+    )
+    app = make_app(maintenance=True)
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 3}]},
+        ),
+        (("apps", "app-id"), {"maintenance": False}),
+    ]
+
+    # The next run continues the ramp
+    formations[0]["quantity"] = 3
+    heroku._http_resource.reset_mock()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 6}]},
+        ),
+    ]
+
+    formations[0]["quantity"] = 6
+    heroku._http_resource.reset_mock()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 8}]},
+        ),
+    ]
+
+
+def test_resizes_app() -> None:
+    heroku = make_heroku(
+        {"SCALING_SCHEDULE": "0900-1700:2@performance-m;1700-0900:1@standard-1x"},
+        [formation_json("web", 1)],
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 2, "size": "performance-m"}]},
+        )
+    ]
+
+
+def test_unsets_expired_disable() -> None:
+    heroku = make_heroku(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(11)).isoformat(),
+        },
+        [formation_json("web", 2)],
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "config-vars"), {"SCALING_SCHEDULE_DISABLE": None}),
+        (
+            ("apps", "app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 2}]},
+        ),
+    ]
+    assert app.schedule_vars == {"SCALING_SCHEDULE": "0900-1700:2"}
+
+
+def test_unsets_expired_disable_without_coverage() -> None:
+    heroku = make_heroku(
+        {
+            "SCALING_SCHEDULE": "0900-1000:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(11)).isoformat(),
+        },
+        [formation_json("web", 2)],
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "config-vars"), {"SCALING_SCHEDULE_DISABLE": None}),
+    ]
+
+
+def test_autoscales_app(tmp_path: Path) -> None:
+    metric_path = tmp_path / "metric"
+    metric_path.write_text("500")
+
+    heroku = make_heroku(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2-4",
+            "SCALING_METRICS_URL_WEB": f"file://{metric_path}",
+            "SCALING_METRICS_SCALE_UP_ABOVE": "300",
+            "SCALING_METRICS_SCALE_DOWN_BELOW": "100",
+        },
+        [formation_json("web", 2)],
+    )
+    app = make_app()
+
+    with time_machine.travel(now_time(time(12))):
+        scale_app(heroku, app)
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "formation"), {"updates": [{"type": "web", "quantity": 3}]})
+    ]
+
+
+def test_batches_actions() -> None:
+    heroku = make_heroku()
+    app = make_app()
+    other_app = AppState(id="other-app-id", name="other-app", maintenance=True)
+
+    apply_actions(
+        heroku,
+        [
+            SetMaintenanceMode(app, True),
+            ScaleProcess(app, "web", ProcessScale(0)),
+            ScaleProcess(other_app, "web", ProcessScale(1)),
+            UpdateConfigVars(app, {"SCALING_SCHEDULE_DISABLE": None}),
+            ScaleProcess(app, "worker", ProcessScale(2, "performance-m")),
+        ],
+    )
+
+    assert get_updates(heroku) == [
+        (("apps", "app-id", "config-vars"), {"SCALING_SCHEDULE_DISABLE": None}),
+        (
+            ("apps", "app-id", "formation"),
+            {
+                "updates": [
+                    {"type": "web", "quantity": 0},
+                    {"type": "worker", "quantity": 2, "size": "performance-m"},
+                ]
+            },
+        ),
+        (("apps", "app-id"), {"maintenance": True}),
+        (
+            ("apps", "other-app-id", "formation"),
+            {"updates": [{"type": "web", "quantity": 1}]},
+        ),
+    ]
+    assert app.maintenance
+
+
+def test_applies_nothing() -> None:
+    heroku = make_heroku()
+
+    apply_actions(heroku, [])
+
+    heroku._http_resource.assert_not_called()
@@ -0,0 +1,200 @@
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from heroku_scheduled_scaling.lock import (
+    REDIS_RELEASE_SCRIPT,
+    REDIS_RENEW_SCRIPT,
+    FileLeaseBackend,
+    RedisLeaseBackend,
+    RunLock,
+    get_lease_backend,
+)
+
+
+class FakeRedis:
+    """
+    A local stand-in for the parts of Redis used by `RedisLeaseBackend`
+    """
+
+    def __init__(self) -> None:
+        self.data: dict[str, tuple[str, float]] = {}
+
+    def _get(self, name: str) -> str | None:
+        if (entry := self.data.get(name)) is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def set(self, name: str, value: str, *, nx: bool, px: int) -> bool:
+        if nx and self._get(name) is not None:
+            return False
+        self.data[name] = (value, time.time() + px / 1000)
+        return True
+
+    def eval(self, script: str, numkeys: int, *keys_and_args: str) -> int:
+        key, token, *args = keys_and_args
+        if self._get(key) != token:
+            return 0
+        if script == REDIS_RENEW_SCRIPT:
+            self.data[key] = (token, time.time() + int(args[0]) / 1000)
+        elif script == REDIS_RELEASE_SCRIPT:
+            del self.data[key]
+        return 1
+
+
+def test_file_lease_excludes_other_runs(tmp_path: Path) -> None:
+    backend = FileLeaseBackend(str(tmp_path / "lock"))
+
+    assert backend.acquire("first", 60)
+    assert not backend.acquire("second", 60)
+    assert backend.acquire("first", 60)
+
+    backend.release("second")
+    assert not backend.acquire("second", 60)
+
+    backend.release("first")
+    assert backend.acquire("second", 60)
+
+
+def test_file_lease_stale_takeover(tmp_path: Path) -> None:
+    backend = FileLeaseBackend(str(tmp_path / "lock"))
+
+    assert backend.acquire("first", -1)
+    assert backend.acquire("second", 60)
+
+    # The original owner can't renew once taken over
+    assert not backend.renew("first", 60)
+    assert backend.renew("second", 60)
+
+
+def test_file_lease_corrupt_file(tmp_path: Path) -> None:
+    lock_path = tmp_path / "lock"
+    lock_path.write_text("not json")
+
+    assert FileLeaseBackend(str(lock_path)).acquire("first", 60)
+
+
+def test_redis_lease() -> None:
+    backend = RedisLeaseBackend(FakeRedis())
+
+    assert backend.acquire("first", 60)
+    assert not backend.acquire("second", 60)
+
+    assert backend.renew("first", 60)
+    assert not backend.renew("second", 60)
+
+    backend.release("second")
+    assert not backend.acquire("second", 60)
+
+    backend.release("first")
+    assert backend.acquire("second", 60)
+
+
+def test_redis_lease_stale_takeover() -> None:
+    backend = RedisLeaseBackend(FakeRedis())
+
+    assert backend.acquire("first", 0.001)
+    time.sleep(0.01)
+    assert backend.acquire("second", 60)
+    assert not backend.renew("first", 60)
+
+
+def test_run_lock(tmp_path: Path) -> None:
+    backend = FileLeaseBackend(str(tmp_path / "lock"))
+
+    first = RunLock(backend)
+    second = RunLock(backend)
+
+    assert first.acquire()
+    assert first.held
+    assert not second.acquire()
+    assert not second.held
+
+    first.release()
+    assert not first.held
+    assert second.acquire()
+
+    second.release()
+
+
+def test_run_lock_renews_lease() -> None:
+    redis = FakeRedis()
+    backend = RedisLeaseBackend(redis)
+
+    run_lock = RunLock(backend)
+    assert run_lock.acquire()
+
+    # Simulate the lease being about to expire
+    redis.data[backend.key] = (run_lock.token, time.time() + 1)
+
+    assert run_lock._renew()
+
+    assert run_lock.held
+    assert redis.data[backend.key][1] > time.time() + 30
+
+    run_lock.release()
+
+
+def test_run_lock_lost() -> None:
+    redis = FakeRedis()
+    backend = RedisLeaseBackend(redis)
+
+    run_lock = RunLock(backend)
+    assert run_lock.acquire()
+
+    # Simulate another run taking over the lease
+    redis.data[backend.key] = ("other", time.time() + 60)
+
+    assert not run_lock._renew()
+
+    assert not run_lock.held
+    run_lock.release()
+
+    assert redis.data[backend.key][0] == "other"
+
+
+def test_run_lock_renewal_error() -> None:
+    backend = MagicMock(wraps=RedisLeaseBackend(FakeRedis()))
+    backend.renew.side_effect = ConnectionError
+
+    run_lock = RunLock(backend)
+    assert run_lock.acquire()
+
+    # Keep trying, as the lease may still be valid
+    assert run_lock._renew()
+    assert run_lock.held
+
+    run_lock.release()
+
+
+def test_run_lock_expires_after_renewal_errors() -> None:
+    redis = FakeRedis()
+    backend = MagicMock(wraps=RedisLeaseBackend(redis))
+    backend.renew.side_effect = ConnectionError
+
+    run_lock = RunLock(backend)
+    assert run_lock.acquire()
+
+    # Simulate renewals failing for longer than the TTL
+    run_lock._renewed_at -= run_lock.ttl
+
+    assert not run_lock._renew()
+    assert not run_lock.held
+
+    run_lock.release()
+
+    # The lease is left to expire, rather than released
+    backend.release.assert_not_called()
+
+
+def test_get_lease_backend(tmp_path: Path) -> None:
+    backend = get_lease_backend(f"file://{tmp_path}/lock")
+    assert isinstance(backend, FileLeaseBackend)
+    assert backend.path == f"{tmp_path}/lock"
+
+    backend = get_lease_backend(f"{tmp_path}/lock")
+    assert isinstance(backend, FileLeaseBackend)
+    assert backend.path == f"{tmp_path}/lock"
+
+    backend = get_lease_backend("redis://localhost:6379/0")
+    assert isinstance(backend, RedisLeaseBackend)
@@ -0,0 +1,150 @@
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+
+from heroku_scheduled_scaling import __main__
+from heroku_scheduled_scaling.lock import get_run_lock
+from heroku_scheduled_scaling.scale import PlanContext
+from heroku_scheduled_scaling.state import AppState
+
+APPS = [AppState(id=f"app-{i}", name=f"app-{i}", maintenance=False) for i in range(20)]
+
+
+@pytest.fixture(autouse=True)
+def environ(monkeypatch: Any, tmp_path: Path) -> None:
+    monkeypatch.setenv("SCALING_LOCK_URL", str(tmp_path / "lock"))
+    monkeypatch.setenv("CONCURRENCY", "1")
+    monkeypatch.setenv("CIRCUIT_BREAKER_MIN_CALLS", "3")
+    monkeypatch.setenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "0.01")
+
+
+def http_error(status_code: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "https://api.heroku.com/apps/app-id"
+    return requests.HTTPError(
+        f"{status_code} Error for {response.url}", response=response
+    )
+
+
+def run_scale_apps(
+    monkeypatch: Any, failing: set[str], invalid: set[str] | None = None
+) -> tuple[list[str], MagicMock]:
+    """
+    Scale all apps, failing those in `failing` as if the API is unavailable, and
+    those in `invalid` with a client error, returning the apps scaled and the
+    degraded run report.
+    """
+    heroku = MagicMock()
+    heroku._session.adapters = {"https://": MagicMock(_pool_connections=10)}
+    monkeypatch.setattr(__main__, "get_heroku_client", lambda: heroku)
+    monkeypatch.setattr(__main__, "get_heroku_apps", lambda heroku: APPS)
+
+    scaled = []
+
+    def scale_app(heroku: MagicMock, app: AppState, context: PlanContext) -> None:
+        if app.id in failing:
+            raise requests.ConnectionError(app.id)
+        if app.id in (invalid or set()):
+            raise http_error(422)
+        app.load_config_vars({"SCALING_SCHEDULE": "0900-1700:2"})
+        scaled.append(app.id)
+
+    monkeypatch.setattr(__main__, "scale_app", scale_app)
+
+    report_degraded_run = MagicMock()
+    monkeypatch.setattr(__main__, "report_degraded_run", report_degraded_run)
+
+    __main__.scale_apps()
+
+    return scaled, report_degraded_run
+
+
+def test_scales_apps(monkeypatch: Any) -> None:
+    scaled, report_degraded_run = run_scale_apps(monkeypatch, set())
+
+    assert sorted(scaled) == sorted(app.id for app in APPS)
+    report_degraded_run.assert_not_called()
+
+    # Apps' state isn't kept for the rest of the run
+    assert all(app.schedule_vars == {} for app in APPS)
+
+
+def test_retries_skipped_apps(monkeypatch: Any) -> None:
+    failing = {app.id for app in APPS[:5]}
+
+    scaled, report_degraded_run = run_scale_apps(monkeypatch, failing)
+
+    # The circuit opens after the first 3 apps, then skipped apps are retried
+    # once the probe succeeds
+    assert sorted(scaled) == sorted(app.id for app in APPS[5:])
+
+    exceptions, skipped = report_degraded_run.call_args.args
+    assert sorted(str(e) for e in exceptions) == sorted(failing)
+    assert skipped == 0
+
+
+def test_stops_when_probe_fails(monkeypatch: Any) -> None:
+    scaled, report_degraded_run = run_scale_apps(monkeypatch, {app.id for app in APPS})
+
+    assert scaled == []
+
+    # 3 apps open the circuit, then the probe fails
+    exceptions, skipped = report_degraded_run.call_args.args
+    assert len(exceptions) == 4
+    assert skipped == 16
+
+
+def test_client_errors_dont_trip_circuit(monkeypatch: Any) -> None:
+    invalid = {app.id for app in APPS[:5]}
+    capture_exception = MagicMock()
+    monkeypatch.setattr(__main__.sentry_sdk, "capture_exception", capture_exception)
+
+    scaled, report_degraded_run = run_scale_apps(monkeypatch, set(), invalid)
+
+    assert sorted(scaled) == sorted(app.id for app in APPS[5:])
+    report_degraded_run.assert_not_called()
+    assert capture_exception.call_count == 5
+
+
+def test_probe_client_error(monkeypatch: Any) -> None:
+    # The circuit opens after the first 3 apps, then the first probe (the last
+    # app) hits a client error
+    scaled, report_degraded_run = run_scale_apps(
+        monkeypatch, {app.id for app in APPS[:3]}, {APPS[-1].id}
+    )
+
+    assert sorted(scaled) == sorted(app.id for app in APPS[3:-1])
+
+    exceptions, skipped = report_degraded_run.call_args.args
+    assert len(exceptions) == 3
+    assert skipped == 0
+
+
+def test_report_degraded_run(monkeypatch: Any) -> None:
+    capture_message = MagicMock()
+    monkeypatch.setattr(__main__.sentry_sdk, "capture_message", capture_message)
+
+    __main__.report_degraded_run(
+        [http_error(503), http_error(503), requests.ConnectionError("app-id")], 4
+    )
+
+    capture_message.assert_called_once_with(
+        "Heroku API degraded: 3 apps failed, 4 apps skipped", level="error"
+    )
+    assert __main__.get_failure_type(http_error(503)) == "HTTPError 503"
+    assert __main__.get_failure_type(requests.Timeout()) == "Timeout"
+
+
+def test_invalid_config_releases_lock(monkeypatch: Any) -> None:
+    monkeypatch.setenv("CIRCUIT_BREAKER_MIN_CALLS", "abc")
+
+    with pytest.raises(ValueError):
+        __main__.scale_apps()
+
+    run_lock = get_run_lock()
+    assert run_lock.acquire()
+    run_lock.release()
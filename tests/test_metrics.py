@@ -0,0 +1,75 @@
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from heroku_scheduled_scaling.metrics import get_autoscaled_quantity, get_metric
+
+NOW = datetime.now(UTC)
+
+
+def test_reads_file_metric(tmp_path: Path) -> None:
+    metric_path = tmp_path / "metric"
+    metric_path.write_text("12.5\n")
+
+    assert get_metric(f"file://{metric_path}") == 12.5
+
+
+@pytest.mark.parametrize("content", ["", "fast", "[1]"])
+def test_invalid_file_metric(tmp_path: Path, content: str) -> None:
+    metric_path = tmp_path / "metric"
+    metric_path.write_text(content)
+
+    assert get_metric(f"file://{metric_path}") is None
+
+
+def test_missing_metric(tmp_path: Path) -> None:
+    assert get_metric(f"file://{tmp_path}/missing") is None
+
+
+def test_unknown_metric_source() -> None:
+    assert get_metric("statsd://localhost:8125/latency") is None
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [(500, 4), (250, 3), (100, 3), (50, 2), (None, 3)],
+)
+def test_autoscales_with_hysteresis(value: float | None, expected: int) -> None:
+    assert get_autoscaled_quantity(3, 1, 5, value, 300, 100) == expected
+
+
+def test_autoscale_bounds() -> None:
+    assert get_autoscaled_quantity(5, 1, 5, 500, 300, 100) == 5
+    assert get_autoscaled_quantity(1, 1, 5, 50, 300, 100) == 1
+
+    # Moving into the bounds takes priority over the metric
+    assert get_autoscaled_quantity(0, 2, 5, 500, 300, 100) == 2
+    assert get_autoscaled_quantity(8, 2, 5, 50, 300, 100) == 5
+
+
+def test_autoscale_cooldown() -> None:
+    assert (
+        get_autoscaled_quantity(3, 1, 5, 500, 300, 100, NOW - timedelta(minutes=2), NOW)
+        == 3
+    )
+    assert (
+        get_autoscaled_quantity(
+            3, 1, 5, 500, 300, 100, NOW - timedelta(minutes=10), NOW
+        )
+        == 4
+    )
+    assert (
+        get_autoscaled_quantity(
+            3,
+            1,
+            5,
+            500,
+            300,
+            100,
+            NOW - timedelta(minutes=10),
+            NOW,
+            cooldown=timedelta(minutes=15),
+        )
+        == 3
+    )
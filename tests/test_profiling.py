@@ -0,0 +1,68 @@
+import threading
+import time
+from pathlib import Path
+
+from heroku_scheduled_scaling.profiling import SamplingProfiler
+
+
+def busy_wait(event: threading.Event) -> None:
+    event.wait()
+
+
+def test_samples_all_threads() -> None:
+    event = threading.Event()
+    thread = threading.Thread(
+        target=busy_wait, args=(event,), name="ThreadPoolExecutor-0_3"
+    )
+    thread.start()
+
+    with SamplingProfiler(interval=0.001) as profiler:
+        time.sleep(0.05)
+
+    event.set()
+    thread.join()
+
+    stacks = list(profiler.samples)
+    assert stacks
+
+    worker_stacks = [stack for stack in stacks if stack[0] == "ThreadPoolExecutor-0"]
+    assert worker_stacks
+    assert all("test_profiling.busy_wait" in stack for stack in worker_stacks)
+
+    # The profiler doesn't sample itself
+    assert not any(stack[0] == "SamplingProfiler" for stack in stacks)
+
+
+def test_collapsed_stacks() -> None:
+    profiler = SamplingProfiler()
+    profiler.samples.update(
+        {("MainThread", "a.main", "a.work"): 3, ("MainThread", "a.main"): 1}
+    )
+
+    assert profiler.collapsed() == ("MainThread;a.main 1\nMainThread;a.main;a.work 3\n")
+
+
+def test_summary() -> None:
+    profiler = SamplingProfiler()
+    assert profiler.summary() == "No samples"
+
+    profiler.samples.update(
+        {
+            ("MainThread", "a.main", "a.work"): 3,
+            ("MainThread", "a.main"): 1,
+        }
+    )
+
+    summary = profiler.summary().splitlines()
+    assert summary[0] == "4 samples, every 10ms"
+    assert summary[2].split() == ["100.0%", "25.0%", "a.main"]
+    assert summary[3].split() == ["75.0%", "75.0%", "a.work"]
+
+
+def test_write(tmp_path: Path) -> None:
+    profiler = SamplingProfiler()
+    profiler.samples.update({("MainThread", "a.main"): 1})
+
+    profiler.write(str(tmp_path / "profile.txt"))
+
+    assert (tmp_path / "profile.txt").read_text() == "MainThread;a.main 1\n"
@@ -1,17 +1,24 @@
-from datetime import datetime, time
-from typing import Any
-from unittest.mock import MagicMock
+from datetime import datetime, time, timedelta
 from zoneinfo import ZoneInfo
 
 import pytest
 import time_machine
-from heroku3.structures import KeyedListResource
 
 from heroku_scheduled_scaling.scale import (
     BOOLEAN_TRUE_STRINGS,
-    get_scale_for_app,
-    scale_app,
+    Action,
+    PlanContext,
+    ProcessScale,
+    ScaleProcess,
+    SetMaintenanceMode,
+    UpdateConfigVars,
+    get_lead_time_for_app,
+    get_process_scale_for_app,
+    get_step_for_app,
+    plan,
 )
+from heroku_scheduled_scaling.schedule import DateRanges
+from heroku_scheduled_scaling.state import AppState
 
 UTC = ZoneInfo("UTC")
 
@@ -22,337 +29,561 @@ def now_time(time_component: time, timezone: ZoneInfo | None = UTC) -> datetime:
     )
 
 
-def test_gets_app_scale() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0900-1700:2;1700-1900:1;1900-0900:0"
+def formation_json(
+    process: str,
+    quantity: int,
+    size: str = "Standard-1X",
+    updated_at: datetime | None = None,
+) -> dict:
+    return {
+        "type": process,
+        "quantity": quantity,
+        "size": size,
+        "updated_at": updated_at.isoformat() if updated_at else None,
     }
 
+
+def make_app(
+    schedule_vars: dict[str, str] | None = None,
+    formations: list[dict] | None = None,
+    maintenance: bool = False,
+) -> AppState:
+    app = AppState(id="app-id", name="app", maintenance=maintenance)
+    app.load_config_vars(schedule_vars or {})
+    app.load_formations(formations or [])
+    return app
+
+
+def scale_now(
+    app: AppState, process: str = "web", context: PlanContext | None = None
+) -> int | None:
+    process_scale = get_process_scale_for_app(
+        app, process, datetime.now(UTC), context or PlanContext()
+    )
+    return None if process_scale is None else process_scale.quantity
+
+
+def plan_now(app: AppState, context: PlanContext | None = None) -> list[Action]:
+    return plan([app], datetime.now(UTC), context or PlanContext())
+
+
+def test_gets_app_scale() -> None:
+    app = make_app({"SCALING_SCHEDULE": "0900-1700:2;1700-1900:1;1900-0900:0"})
+
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
+        assert scale_now(app) == 2
 
     with time_machine.travel(now_time(time(22))):
-        assert get_scale_for_app(app) == 0
+        assert scale_now(app) == 0
 
 
 def test_gets_app_scale_with_day_of_week() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0-1(0900-1700:2;1700-1900:1;1900-0900:0);2-6(0000-2359:0)"
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0-1(0900-1700:2;1700-1900:1;1900-0900:0);2-6(0000-2359:0)"
+        }
+    )
 
     monday = datetime(1970, 1, 5).replace(tzinfo=UTC)
     assert monday.weekday() == 0
 
     with time_machine.travel(datetime.combine(monday, time(12))):
-        assert get_scale_for_app(app) == 2
+        assert scale_now(app) == 2
 
     with time_machine.travel(datetime.combine(monday, time(22))):
-        assert get_scale_for_app(app) == 0
+        assert scale_now(app) == 0
 
     # 1970-01-01 is a Thursday
     with time_machine.travel(
         datetime.combine(datetime(1970, 1, 1).replace(tzinfo=UTC), time(12))
     ):
-        assert get_scale_for_app(app) == 0
+        assert scale_now(app) == 0
 
 
 def test_gets_app_scale_for_process() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE_WEB": "0900-1700:2;1700-1900:1;1900-0900:0",
-        "SCALING_SCHEDULE_WORKER": "0000-2359:3",
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE_WEB": "0900-1700:2;1700-1900:1;1900-0900:0",
+            "SCALING_SCHEDULE_WORKER": "0000-2359:3",
+        }
+    )
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
-        assert get_scale_for_app(app, "web") == 2
-        assert get_scale_for_app(app, "worker") == 3
+        assert scale_now(app) == 2
+        assert scale_now(app, "web") == 2
+        assert scale_now(app, "worker") == 3
 
 
 def test_gets_app_scale_for_specific_process() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0900-1700:2;1700-1900:1;1900-0900:0",
-        "SCALING_SCHEDULE_WORKER": "0000-2359:3",
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2;1700-1900:1;1900-0900:0",
+            "SCALING_SCHEDULE_WORKER": "0000-2359:3",
+        }
+    )
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
-        assert get_scale_for_app(app, "web") == 2
-        assert get_scale_for_app(app, "worker") == 3
+        assert scale_now(app) == 2
+        assert scale_now(app, "web") == 2
+        assert scale_now(app, "worker") == 3
 
 
 def test_no_scale_coverage() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "0900-1700:2"}
+    app = make_app({"SCALING_SCHEDULE": "0900-1700:2"})
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
+        assert scale_now(app) == 2
 
     with time_machine.travel(now_time(time(22))):
-        assert get_scale_for_app(app) is None
+        assert scale_now(app) is None
 
 
 @pytest.mark.parametrize("truthy_value", BOOLEAN_TRUE_STRINGS)
 def test_schedule_disabled(truthy_value: str) -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0900-1700:2",
-        "SCALING_SCHEDULE_DISABLE": truthy_value,
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2",
+            "SCALING_SCHEDULE_DISABLE": truthy_value,
+        },
+        [formation_json("web", 0)],
+    )
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) is None
+        assert plan_now(app) == []
 
     with time_machine.travel(now_time(time(22))):
-        assert get_scale_for_app(app) is None
+        assert plan_now(app) == []
 
 
 def test_schedule_temporarily_disabled() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0900-1700:2",
-        "SCALING_SCHEDULE_DISABLE": now_time(time(12)).isoformat(),
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(12)).isoformat(),
+        },
+        [formation_json("web", 0)],
+    )
 
     with time_machine.travel(now_time(time(10))):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     # The block has now expired
     with time_machine.travel(now_time(time(13))):
-        assert get_scale_for_app(app) == 2
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
+        assert plan_now(app)[0] == UpdateConfigVars(
+            app, {"SCALING_SCHEDULE_DISABLE": None}
+        )
+
+
+def test_schedule_temporarily_disabled_without_coverage() -> None:
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1000:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(11)).isoformat(),
+        },
+        [formation_json("web", 0)],
+    )
 
-    app.config.return_value.update.assert_called_with(
-        {"SCALING_SCHEDULE_DISABLE": None}
+    # The expired block is unset, even though the schedule doesn't apply
+    with time_machine.travel(now_time(time(12))):
+        assert plan_now(app) == [
+            UpdateConfigVars(app, {"SCALING_SCHEDULE_DISABLE": None})
+        ]
+
+    # Without a schedule, the config is left alone
+    app = make_app(
+        {"SCALING_SCHEDULE_DISABLE": now_time(time(11)).isoformat()},
+        [formation_json("web", 0)],
     )
+    with time_machine.travel(now_time(time(12))):
+        assert plan_now(app) == []
 
 
 def test_schedule_temporarily_disabled_naive() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0900-1700:2",
-        "SCALING_SCHEDULE_DISABLE": now_time(time(12), None).isoformat(),
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(12), None).isoformat(),
+        },
+        [formation_json("web", 0)],
+    )
 
     with time_machine.travel(now_time(time(10))):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     # The block has now expired
     with time_machine.travel(now_time(time(13))):
-        assert get_scale_for_app(app) == 2
-
-    app.config.return_value.update.assert_called_with(
-        {"SCALING_SCHEDULE_DISABLE": None}
-    )
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
+        assert plan_now(app)[0] == UpdateConfigVars(
+            app, {"SCALING_SCHEDULE_DISABLE": None}
+        )
 
 
 def test_schedule_temporarily_disabled_in_behind_timezone() -> None:
-    app = MagicMock()
-
     timezone = ZoneInfo("America/Los_Angeles")
 
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0000-2359:2",
-        "SCALING_SCHEDULE_DISABLE": now_time(time(9), timezone).isoformat(),
-        "SCALING_SCHEDULE_TIMEZONE": timezone.key,
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0000-2359:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(9), timezone).isoformat(),
+            "SCALING_SCHEDULE_TIMEZONE": timezone.key,
+        },
+        [formation_json("web", 0)],
+    )
 
     with time_machine.travel(now_time(time(13))):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     with time_machine.travel(now_time(time(8), timezone)):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     # The block has now expired
     with time_machine.travel(now_time(time(19))):
-        assert get_scale_for_app(app) == 2
-
-    app.config.return_value.update.assert_called_with(
-        {"SCALING_SCHEDULE_DISABLE": None}
-    )
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
+        assert plan_now(app)[0] == UpdateConfigVars(
+            app, {"SCALING_SCHEDULE_DISABLE": None}
+        )
 
     with time_machine.travel(now_time(time(10), timezone)):
-        assert get_scale_for_app(app) == 2
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
 
 
 def test_schedule_temporarily_disabled_in_ahead_timezone() -> None:
-    app = MagicMock()
-
     timezone = ZoneInfo("Australia/Perth")
 
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "0000-2359:2",
-        "SCALING_SCHEDULE_DISABLE": now_time(time(20), timezone).isoformat(),
-        "SCALING_SCHEDULE_TIMEZONE": timezone.key,
-    }
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0000-2359:2",
+            "SCALING_SCHEDULE_DISABLE": now_time(time(20), timezone).isoformat(),
+            "SCALING_SCHEDULE_TIMEZONE": timezone.key,
+        },
+        [formation_json("web", 0)],
+    )
 
     with time_machine.travel(now_time(time(10))):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     with time_machine.travel(now_time(time(19), timezone)):
-        assert get_scale_for_app(app) is None
-
-    app.config.return_value.update.assert_not_called()
+        assert plan_now(app) == []
 
     # The block has now expired
     with time_machine.travel(now_time(time(14))):
-        assert get_scale_for_app(app) == 2
-
-    app.config.return_value.update.assert_called_with(
-        {"SCALING_SCHEDULE_DISABLE": None}
-    )
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
+        assert plan_now(app)[0] == UpdateConfigVars(
+            app, {"SCALING_SCHEDULE_DISABLE": None}
+        )
 
     with time_machine.travel(now_time(time(21), timezone)):
-        assert get_scale_for_app(app) == 2
+        assert ScaleProcess(app, "web", ProcessScale(2)) in plan_now(app)
 
 
 def test_invalid_schedule() -> None:
-    app = MagicMock()
-
-    app.config.return_value.to_dict.return_value = {
-        "SCALING_SCHEDULE": "Not a schedule"
-    }
+    app = make_app({"SCALING_SCHEDULE": "Not a schedule"})
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) is None
+        assert scale_now(app) is None
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) is None
+        assert scale_now(app) is None
 
 
 def test_no_app_schedule() -> None:
-    app = MagicMock()
+    app = make_app({})
 
-    app.config.return_value.to_dict.return_value = {}
+    assert scale_now(app) is None
 
-    assert get_scale_for_app(app) is None
 
-
-def test_gets_app_scale_template(monkeypatch: Any) -> None:
-    monkeypatch.setenv(
-        "SCHEDULE_TEMPLATE_WORKING_HOURS", "0900-1700:2;1700-1900:1;1900-0900:0"
+def test_gets_app_scale_template() -> None:
+    context = PlanContext(
+        templates={"WORKING_HOURS": "0900-1700:2;1700-1900:1;1900-0900:0"}
     )
 
-    app = MagicMock()
+    app = make_app({"SCALING_SCHEDULE": "WORKING_HOURS"})
+
+    with time_machine.travel(now_time(time(12))):
+        assert scale_now(app, context=context) == 2
+
+    with time_machine.travel(now_time(time(22))):
+        assert scale_now(app, context=context) == 0
+
+
+def test_gets_app_scale_template_recursive() -> None:
+    context = PlanContext(
+        templates={
+            "OFFICE_HOURS": "0900-1700:2;1700-1900:1;1900-0900:0",
+            "WORKING_HOURS": "OFFICE_HOURS",
+        }
+    )
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "WORKING_HOURS"}
+    app = make_app({"SCALING_SCHEDULE": "WORKING_HOURS"})
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
+        assert scale_now(app, context=context) == 2
 
     with time_machine.travel(now_time(time(22))):
-        assert get_scale_for_app(app) == 0
+        assert scale_now(app, context=context) == 0
+
+
+def test_gets_app_scale_with_lead_time() -> None:
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:2;1700-1900:1;1900-0900:0",
+            "SCALING_SCHEDULE_LEAD_MINUTES_WORKER": "30",
+        }
+    )
+
+    with time_machine.travel(now_time(time(8, 45))):
+        assert scale_now(app) == 0
+        assert scale_now(app, "worker") == 2
+
+    context = PlanContext(default_lead_time=timedelta(minutes=20))
 
+    with time_machine.travel(now_time(time(8, 45))):
+        assert scale_now(app, context=context) == 2
 
-def test_gets_app_scale_template_recursive(monkeypatch: Any) -> None:
-    monkeypatch.setenv(
-        "SCHEDULE_TEMPLATE_OFFICE_HOURS", "0900-1700:2;1700-1900:1;1900-0900:0"
+    # Scale downs still happen on time
+    with time_machine.travel(now_time(time(16, 45))):
+        assert scale_now(app, context=context) == 2
+        assert scale_now(app, "worker", context) == 2
+
+
+@pytest.mark.parametrize("lead_minutes", ["", "soon", "-10"])
+def test_invalid_lead_time(lead_minutes: str) -> None:
+    assert (
+        get_lead_time_for_app({"SCALING_SCHEDULE_LEAD_MINUTES": lead_minutes}, "web")
+        == timedelta()
     )
-    monkeypatch.setenv("SCHEDULE_TEMPLATE_WORKING_HOURS", "OFFICE_HOURS")
 
-    app = MagicMock()
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "WORKING_HOURS"}
+def test_does_not_ramp_scale_down() -> None:
+    app = make_app(
+        {"SCALING_SCHEDULE": "0900-1700:0", "SCALING_SCHEDULE_STEP": "1"},
+        [formation_json("web", 8)],
+    )
 
     with time_machine.travel(now_time(time(12))):
-        assert get_scale_for_app(app) == 2
+        assert scale_now(app, "web") == 0
+        assert scale_now(app, "worker") == 0
 
-    with time_machine.travel(now_time(time(22))):
-        assert get_scale_for_app(app) == 0
 
+@pytest.mark.parametrize("step", ["", "lots"])
+def test_invalid_step(step: str) -> None:
+    assert get_step_for_app({"SCALING_SCHEDULE_STEP": step}, "web") is None
 
-def test_does_nothing_when_matching_schedule() -> None:
-    app = MagicMock()
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "0900-1700:2"}
-    app.process_formation.return_value["web"].quantity = 2
+def test_autoscales_app() -> None:
+    metrics_url = "https://metrics.example.com/web"
+    schedule_vars = {
+        "SCALING_SCHEDULE": "0900-1700:2-4;1700-0900:0",
+        "SCALING_METRICS_URL_WEB": metrics_url,
+        "SCALING_METRICS_SCALE_UP_ABOVE": "300",
+        "SCALING_METRICS_SCALE_DOWN_BELOW": "100",
+    }
 
+    def get_scale(
+        quantity: int,
+        updated_at: datetime | None = None,
+        value: float | None = 500,
+        hour: int = 12,
+    ) -> int | None:
+        app = make_app(
+            schedule_vars, [formation_json("web", quantity, updated_at=updated_at)]
+        )
+        process_scale = get_process_scale_for_app(
+            app,
+            "web",
+            now_time(time(hour)),
+            PlanContext(),
+            {} if value is None else {metrics_url: value},
+        )
+        return None if process_scale is None else process_scale.quantity
+
+    # The metric applies within the schedule's bounds
+    assert get_scale(2) == 3
+    assert get_scale(4) == 4
+    assert get_scale(0) == 2
+
+    # Without a running process, use the minimum
     with time_machine.travel(now_time(time(12))):
-        scale_app(app)
+        assert scale_now(make_app(schedule_vars), "web") == 2
 
-    app.process_formation.return_value["web"].update.assert_not_called()
-    app.enable_maintenance_mode.assert_not_called()
-    app.disable_maintenance_mode.assert_not_called()
+    # Not autoscaled during the cooldown
+    assert get_scale(2, now_time(time(11, 59))) == 2
 
+    # Without a value, the current scale is kept
+    assert get_scale(3, value=None) == 3
 
-def test_scales_app() -> None:
-    app = MagicMock()
+    assert get_scale(3, value=50) == 2
+    assert get_scale(3, hour=22) == 0
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "0900-1700:2"}
-    app.maintenance = False
 
-    formation = MagicMock()
-    formation.type = "web"
-    formation._ids = ["web"]
-    formation.quantity = 1
+def test_lead_time_keeps_downsize_on_time() -> None:
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0900-1700:1;1700-0900:2@standard-1x",
+            "SCALING_SCHEDULE_LEAD_MINUTES": "30",
+        },
+        [formation_json("worker", 1, "Performance-L")],
+    )
 
-    app.process_formation.return_value = KeyedListResource([formation])
+    assert get_process_scale_for_app(
+        app, "worker", now_time(time(16, 45)), PlanContext()
+    ) == ProcessScale(1)
+    assert get_process_scale_for_app(
+        app, "worker", now_time(time(17, 1)), PlanContext()
+    ) == ProcessScale(2, "standard-1x")
+
+
+def test_lead_time_when_autoscaling() -> None:
+    metrics_url = "https://metrics.example.com/web"
+    schedule_vars = {
+        "SCALING_METRICS_URL": metrics_url,
+        "SCALING_METRICS_SCALE_UP_ABOVE": "300",
+        "SCALING_METRICS_SCALE_DOWN_BELOW": "100",
+        "SCALING_SCHEDULE_LEAD_MINUTES": "15",
+    }
 
-    with time_machine.travel(now_time(time(12))):
-        scale_app(app)
+    def get_scale(schedule: str, quantity: int, value: float, hour: time) -> int:
+        app = make_app(
+            {**schedule_vars, "SCALING_SCHEDULE": schedule},
+            [formation_json("web", quantity)],
+        )
+        process_scale = get_process_scale_for_app(
+            app, "web", now_time(hour), PlanContext(), {metrics_url: value}
+        )
+        assert process_scale is not None
+        return process_scale.quantity
+
+    # Autoscaled above the upcoming schedule, so it's not a scale up
+    assert get_scale("0900-1700:2-6;1700-1800:3", 5, 500, time(16, 30)) == 6
+    assert get_scale("0900-1700:2-6;1700-1800:3", 5, 500, time(16, 50)) == 6
+    assert get_scale("0900-1700:2-6;1700-1800:3", 5, 500, time(17, 1)) == 3
+
+    # Autoscaled below the upcoming schedule
+    assert get_scale("0900-1700:2-6;1700-1800:5", 2, 200, time(16, 50)) == 5
+
+    # Bringing forward an autoscaled schedule
+    assert get_scale("0000-0859:1;0900-1700:2-6", 4, 500, time(8, 50)) == 5
+
+
+@pytest.mark.parametrize(
+    "thresholds",
+    [
+        {},
+        {"SCALING_METRICS_SCALE_UP_ABOVE": "300"},
+        {
+            "SCALING_METRICS_SCALE_UP_ABOVE": "100",
+            "SCALING_METRICS_SCALE_DOWN_BELOW": "300",
+        },
+        {
+            "SCALING_METRICS_SCALE_UP_ABOVE": "high",
+            "SCALING_METRICS_SCALE_DOWN_BELOW": "low",
+        },
+    ],
+)
+def test_invalid_autoscaling_config(thresholds: dict[str, str]) -> None:
+    metrics_url = "https://metrics.example.com/web"
+    app = make_app(
+        {
+            "SCALING_SCHEDULE": "0000-2359:2-4",
+            "SCALING_METRICS_URL": metrics_url,
+            **thresholds,
+        },
+        [formation_json("web", 3)],
+    )
+
+    assert get_process_scale_for_app(
+        app, "web", now_time(time(12)), PlanContext(), {metrics_url: 500}
+    ) == ProcessScale(2)
 
-    app.batch_scale_formation_processes.assert_called_with({"web": 2})
-    app.enable_maintenance_mode.assert_not_called()
-    app.disable_maintenance_mode.assert_not_called()
 
+def test_gets_app_scale_with_calendar() -> None:
+    context = PlanContext.from_environ(
+        {
+            "SCHEDULE_CALENDAR_UK_HOLIDAYS": "2025-12-25;2025-12-26",
+            "SCHEDULE_CALENDAR_INVALID": "Christmas",
+        }
+    )
 
-def test_enables_maintenance_mode() -> None:
-    app = MagicMock()
+    app = make_app(
+        {"SCALING_SCHEDULE": "UK_HOLIDAYS(0000-2359:0);0900-1700:2;1700-0900:0"}
+    )
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "0900-1700:0"}
-    app.maintenance = False
+    with time_machine.travel(datetime(2025, 12, 24, 12, tzinfo=UTC)):
+        assert scale_now(app, context=context) == 2
 
-    formation = MagicMock()
-    formation.type = "web"
-    formation._ids = ["web"]
-    formation.quantity = 1
+    with time_machine.travel(datetime(2025, 12, 25, 12, tzinfo=UTC)):
+        assert scale_now(app, context=context) == 0
 
-    app.process_formation.return_value = KeyedListResource([formation])
 
-    with time_machine.travel(now_time(time(12))):
-        scale_app(app)
+def test_plan() -> None:
+    web_app = make_app(
+        {"SCALING_SCHEDULE": "DAYTIME", "SCALING_SCHEDULE_TIMEZONE": "Asia/Tokyo"},
+        [formation_json("web", 1), formation_json("release", 0)],
+    )
+    worker_app = make_app(
+        {
+            "SCALING_SCHEDULE_WORKER": "0900-1700:3@performance-m;1700-0900:0",
+            "SCALING_SCHEDULE_WEB": "0900-1700:1",
+            "SCALING_SCHEDULE_DISABLE": "2020-01-01T00:00:00",
+        },
+        [formation_json("web", 0), formation_json("worker", 0)],
+        maintenance=True,
+    )
+    context = PlanContext(
+        templates={"DAYTIME": "0900-1700:2;1700-0900:0"},
+        default_timezone=ZoneInfo("Europe/London"),
+    )
 
-    app.batch_scale_formation_processes.assert_called_with({"web": 0})
-    app.enable_maintenance_mode.assert_called()
-    app.disable_maintenance_mode.assert_not_called()
+    # 10:00 in London, 18:00 in Tokyo
+    now = datetime(2025, 1, 6, 10, tzinfo=UTC)
 
+    assert plan([web_app, worker_app], now, context) == [
+        ScaleProcess(web_app, "web", ProcessScale(0)),
+        SetMaintenanceMode(web_app, True),
+        UpdateConfigVars(worker_app, {"SCALING_SCHEDULE_DISABLE": None}),
+        ScaleProcess(worker_app, "web", ProcessScale(1)),
+        ScaleProcess(worker_app, "worker", ProcessScale(3, "performance-m")),
+        SetMaintenanceMode(worker_app, False),
+    ]
 
-def test_disables_maintenance_mode() -> None:
-    app = MagicMock()
 
-    app.config.return_value.to_dict.return_value = {"SCALING_SCHEDULE": "0900-1700:1"}
-    app.maintenance = True
+def test_plan_without_schedule() -> None:
+    app = make_app({}, [formation_json("web", 1)])
 
-    formation = MagicMock()
-    formation.type = "web"
-    formation._ids = ["web"]
-    formation.quantity = 0
+    assert plan([app], datetime.now(UTC), PlanContext()) == []
 
-    app.process_formation.return_value = KeyedListResource([formation])
 
-    with time_machine.travel(now_time(time(12))):
-        scale_app(app)
+def test_plan_context_from_environ() -> None:
+    context = PlanContext.from_environ(
+        {
+            "SCHEDULE_TEMPLATE_DAYTIME": "0900-1700:2",
+            "SCHEDULE_CALENDAR_HOLIDAYS": "2025-12-25",
+            "SCHEDULE_CALENDAR_INVALID": "Christmas",
+            "SCALING_SCHEDULE_TIMEZONE": "Europe/London",
+            "SCALING_SCHEDULE_LEAD_MINUTES": "10",
+            "SCALING_SCHEDULE": "0900-1700:1",
+        }
+    )
+
+    assert context.templates == {"DAYTIME": "0900-1700:2"}
+    assert list(context.calendars) == ["HOLIDAYS"]
+    assert context.default_timezone == ZoneInfo("Europe/London")
+    assert context.default_lead_time == timedelta(minutes=10)
 
-    app.batch_scale_formation_processes.assert_called_with({"web": 1})
+    assert PlanContext.from_environ({}) == PlanContext()
 
-    app.enable_maintenance_mode.assert_not_called()
-    app.disable_maintenance_mode.assert_called()
+
+def test_undefined_calendar(caplog: pytest.LogCaptureFixture) -> None:
+    app = make_app(
+        {"SCALING_SCHEDULE": "UK_HOLIDAY(0000-2359:0);0000-2359:2"},
+        [formation_json("web", 2)],
+    )
+    context = PlanContext(calendars={"UK_HOLIDAYS": DateRanges()})
+
+    assert get_process_scale_for_app(
+        app, "web", now_time(time(12)), context
+    ) == ProcessScale(2)
+    assert caplog.messages == [
+        "Schedule for app (web) uses an undefined calendar: UK_HOLIDAY"
+    ]
@@ -1,9 +1,18 @@
 import string
-from datetime import datetime, time
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
 
+import pytest
 from hypothesis import given, strategies
 
-from heroku_scheduled_scaling.schedule import Schedule, parse_schedule
+from heroku_scheduled_scaling.schedule import (
+    DateRanges,
+    Schedule,
+    get_active_schedule,
+    is_downsize,
+    parse_calendar,
+    parse_schedule,
+)
 
 NOW = datetime.now()
 TODAY = NOW.date()
@@ -63,15 +72,198 @@ def test_parses_single_schedule() -> None:
     assert schedules[0].serialize() == "0-6(0900-1700:3)"
 
 
+def test_parses_schedule_with_size() -> None:
+    schedules = parse_schedule(
+        "0-4(0900-1700:2@performance-m;1700-0900:1@Standard-1X);0000-2359:1"
+    )
+
+    assert len(schedules) == 3
+
+    assert schedules[0] == Schedule(time(9), time(17), 2, 0, 4, "performance-m")
+    assert schedules[1] == Schedule(time(17), time(9), 1, 0, 4, "Standard-1X")
+    assert schedules[2] == Schedule(time(0), time(23, 59), 1)
+
+    assert schedules[0].serialize() == "0-4(0900-1700:2@performance-m)"
+
+
+def test_parses_schedule_with_max_scale() -> None:
+    schedules = parse_schedule("0900-1700:2-6@performance-m;1700-0900:1-1")
+
+    assert len(schedules) == 2
+
+    assert schedules[0] == Schedule(
+        time(9), time(17), 2, size="performance-m", max_scale=6
+    )
+    assert schedules[1] == Schedule(time(17), time(9), 1, max_scale=1)
+
+    assert schedules[0].serialize() == "0-6(0900-1700:2-6@performance-m)"
+
+
+def test_max_scale_below_scale() -> None:
+    assert len(parse_schedule("0000-2359:3-1")) == 0
+
+
+def test_parses_schedule_with_dates() -> None:
+    schedules = parse_schedule(
+        "2025-12-25(0000-2359:0);2025-12-24..2025-12-31(0900-1700:1);0900-1700:2"
+    )
+
+    assert len(schedules) == 3
+
+    assert schedules[0] == Schedule(
+        time(0),
+        time(23, 59),
+        0,
+        start_date=date(2025, 12, 25),
+        end_date=date(2025, 12, 25),
+    )
+    assert schedules[1] == Schedule(
+        time(9),
+        time(17),
+        1,
+        start_date=date(2025, 12, 24),
+        end_date=date(2025, 12, 31),
+    )
+    assert schedules[2] == Schedule(time(9), time(17), 2)
+
+    assert schedules[1].serialize() == "2025-12-24..2025-12-31(0900-1700:1)"
+    assert parse_schedule(schedules[1].serialize()) == [schedules[1]]
+
+
+def test_parses_schedule_with_calendar() -> None:
+    schedules = parse_schedule("UK_HOLIDAYS(0000-2359:0);0900-1700:2")
+
+    assert len(schedules) == 2
+
+    assert schedules[0] == Schedule(time(0), time(23, 59), 0, calendar="UK_HOLIDAYS")
+    assert schedules[0].serialize() == "UK_HOLIDAYS(0000-2359:0)"
+    assert parse_schedule(schedules[0].serialize()) == [schedules[0]]
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    [
+        "2025-13-01(0000-2359:0)",
+        "2025-12-31..2025-12-24(0000-2359:0)",
+        "uk_holidays(0000-2359:0)",
+    ],
+)
+def test_invalid_dates(schedule: str) -> None:
+    assert len(parse_schedule(schedule)) == 0
+
+
+def test_schedule_covers_dates() -> None:
+    schedule = Schedule(
+        time(9), time(17), 1, start_date=date(2025, 12, 24), end_date=date(2025, 12, 26)
+    )
+
+    assert not schedule.covers(datetime(2025, 12, 23, 12))
+    assert schedule.covers(datetime(2025, 12, 24, 12))
+    assert schedule.covers(datetime(2025, 12, 26, 12))
+    assert not schedule.covers(datetime(2025, 12, 26, 18))
+    assert not schedule.covers(datetime(2025, 12, 27, 12))
+
+
+def test_schedule_covers_calendar() -> None:
+    schedule = Schedule(time(0), time(23, 59), 0, calendar="UK_HOLIDAYS")
+    calendars = {"UK_HOLIDAYS": DateRanges.from_ranges([(date(2025, 12, 25),) * 2])}
+
+    assert schedule.covers(datetime(2025, 12, 25, 12), calendars)
+    assert not schedule.covers(datetime(2025, 12, 24, 12), calendars)
+
+    # Unknown calendars cover nothing
+    assert not schedule.covers(datetime(2025, 12, 25, 12))
+    assert not schedule.covers(datetime(2025, 12, 25, 12), {})
+
+
+def test_date_ranges() -> None:
+    date_ranges = DateRanges.from_ranges(
+        [
+            (date(2026, 1, 1), date(2026, 1, 1)),
+            (date(2025, 12, 24), date(2025, 12, 26)),
+            (date(2025, 12, 25), date(2025, 12, 25)),
+            (date(2025, 12, 27), date(2025, 12, 28)),
+        ]
+    )
+
+    # Overlapping and adjacent ranges are merged
+    assert date_ranges.starts == (date(2025, 12, 24), date(2026, 1, 1))
+    assert date_ranges.ends == (date(2025, 12, 28), date(2026, 1, 1))
+
+    assert date(2025, 12, 23) not in date_ranges
+    assert date(2025, 12, 24) in date_ranges
+    assert date(2025, 12, 28) in date_ranges
+    assert date(2025, 12, 29) not in date_ranges
+    assert date(2026, 1, 1) in date_ranges
+    assert date(2026, 1, 2) not in date_ranges
+    assert date(2025, 12, 24) not in DateRanges()
+
+
+@given(
+    strategies.lists(strategies.tuples(strategies.dates(), strategies.dates())),
+    strategies.dates(),
+)
+def test_date_ranges_contains(
+    date_ranges: list[tuple[date, date]], value: date
+) -> None:
+    date_ranges = [(min(pair), max(pair)) for pair in date_ranges]
+
+    assert (value in DateRanges.from_ranges(date_ranges)) == any(
+        start <= value <= end for start, end in date_ranges
+    )
+
+
+def test_parses_calendar() -> None:
+    assert parse_calendar("2025-12-25;2025-12-26;2025-12-31..2026-01-01") == (
+        DateRanges.from_ranges(
+            [
+                (date(2025, 12, 25), date(2025, 12, 26)),
+                (date(2025, 12, 31), date(2026, 1, 1)),
+            ]
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "calendar", ["", "Christmas", "2025-12-25;", "2025-02-30", "2026-01-01..2025-12-31"]
+)
+def test_invalid_calendar(calendar: str) -> None:
+    assert parse_calendar(calendar) is None
+
+
+def test_lead_time_into_calendar() -> None:
+    schedules = parse_schedule("UK_HOLIDAYS(0000-2359:4);0000-2359:1")
+    calendars = {"UK_HOLIDAYS": DateRanges.from_ranges([(date(2025, 12, 25),) * 2])}
+
+    assert get_active_schedule(
+        schedules, datetime(2025, 12, 24, 23, 45), timedelta(minutes=30), calendars
+    ) == Schedule(time(0), time(23, 59), 4, calendar="UK_HOLIDAYS")
+
+
+def test_invalid_size() -> None:
+    assert len(parse_schedule("0000-2359:1@")) == 0
+    assert len(parse_schedule("0000-2359:1@standard 1x")) == 0
+
+
 @given(
     strategies.times(),
     strategies.times(),
     strategies.integers(min_value=0),
     strategies.integers(min_value=0, max_value=6),
     strategies.integers(min_value=0, max_value=6),
+    strategies.one_of(
+        strategies.none(), strategies.from_regex(r"[A-Za-z0-9-]+", fullmatch=True)
+    ),
+    strategies.one_of(strategies.none(), strategies.integers(min_value=0)),
 )
 def test_e2e_parse(
-    start_time: time, end_time: time, scale: int, start_day: int, end_day: int
+    start_time: time,
+    end_time: time,
+    scale: int,
+    start_day: int,
+    end_day: int,
+    size: str | None,
+    max_scale_increase: int | None,
 ) -> None:
     schedule = Schedule(
         start_time.replace(second=0, microsecond=0),
@@ -79,6 +271,8 @@ def test_e2e_parse(
         scale,
         start_day,
         end_day,
+        size,
+        None if max_scale_increase is None else scale + max_scale_increase,
     )
 
     assert parse_schedule(schedule.serialize()) == [schedule]
@@ -138,3 +332,170 @@ def test_invalid_schedule(schedule_candidate: str) -> None:
 @given(strategies.text(alphabet=string.digits))
 def test_invalid_time(strategy_time: str) -> None:
     parse_schedule(f"{strategy_time}-2359:1")
+
+
+def test_active_schedule() -> None:
+    schedules = parse_schedule("0900-1700:2;1700-1900:1;1900-0900:0")
+
+    assert get_active_schedule(schedules, datetime.combine(TODAY, time(12))) == (
+        Schedule(time(9), time(17), 2)
+    )
+    assert get_active_schedule(schedules, datetime.combine(TODAY, time(22))) == (
+        Schedule(time(19), time(9), 0)
+    )
+    assert (
+        get_active_schedule(
+            parse_schedule("0900-1700:2"), datetime.combine(TODAY, time(22))
+        )
+        is None
+    )
+
+
+def test_lead_time_brings_scale_up_forward() -> None:
+    schedules = parse_schedule("0900-1700:2;1700-1900:1;1900-0900:0")
+    lead_time = timedelta(minutes=15)
+
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(8, 40)), lead_time
+    ) == Schedule(time(19), time(9), 0)
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(8, 45)), lead_time
+    ) == Schedule(time(9), time(17), 2)
+
+
+def test_lead_time_keeps_scale_down_on_time() -> None:
+    schedules = parse_schedule("0900-1700:2;1700-1900:1;1900-0900:0")
+    lead_time = timedelta(minutes=15)
+
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(16, 55)), lead_time
+    ) == Schedule(time(9), time(17), 2)
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(18, 55)), lead_time
+    ) == Schedule(time(17), time(19), 1)
+
+
+def test_lead_time_keeps_downsize_on_time() -> None:
+    schedules = parse_schedule("0900-1700:2@performance-l;1700-1800:3@standard-1x")
+    lead_time = timedelta(minutes=15)
+
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(16, 50)), lead_time
+    ) == Schedule(time(9), time(17), 2, size="performance-l")
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(17, 1)), lead_time
+    ) == Schedule(time(17), time(18), 3, size="standard-1x")
+
+
+def test_lead_time_keeps_downsize_from_current_size_on_time() -> None:
+    schedules = parse_schedule("0900-1700:1;1700-0900:2@standard-1x")
+    lead_time = timedelta(minutes=30)
+    now = datetime.combine(TODAY, time(16, 45))
+
+    assert get_active_schedule(
+        schedules, now, lead_time, current_size="Performance-L"
+    ) == Schedule(time(9), time(17), 1)
+    assert get_active_schedule(
+        schedules, now, lead_time, current_size="Basic"
+    ) == Schedule(time(17), time(9), 2, size="standard-1x")
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    [
+        "0000-0859:0;0900-1700:4@performance-m",
+        "0000-0859:0@standard-1x;0900-1700:4@Performance-M",
+        "0000-0859:0@performance-m;0900-1700:4",
+    ],
+)
+def test_lead_time_brings_upsize_forward(schedule: str) -> None:
+    schedules = parse_schedule(schedule)
+
+    assert (
+        get_active_schedule(
+            schedules, datetime.combine(TODAY, time(8, 50)), timedelta(minutes=15)
+        )
+        == schedules[1]
+    )
+
+
+@pytest.mark.parametrize(
+    "current,upcoming,expected",
+    [
+        (None, "standard-1x", False),
+        ("performance-l", None, False),
+        ("Standard-1X", "standard-1x", False),
+        ("standard-1x", "performance-m", False),
+        ("performance-l", "standard-2x", True),
+        ("private-m", "private-s", True),
+        ("standard-1x", "unknown", True),
+    ],
+)
+def test_is_downsize(current: str | None, upcoming: str | None, expected: bool) -> None:
+    assert is_downsize(current, upcoming) is expected
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    [
+        "0800-0829:1;0830-0844:3@standard-2x;0845-0900:2@performance-l",
+        "0800-0829:1;0830-0844:2@performance-l;0845-0900:3@standard-2x",
+    ],
+)
+def test_lead_time_checks_boundaries_in_order(schedule: str) -> None:
+    schedules = parse_schedule(schedule)
+
+    assert (
+        get_active_schedule(
+            schedules, datetime.combine(TODAY, time(8, 20)), timedelta(minutes=30)
+        )
+        == schedules[1]
+    )
+
+
+def test_lead_time_uncovers_later_rule() -> None:
+    schedules = parse_schedule("0900-1700:0;0000-2359:3")
+
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(16, 50)), timedelta(minutes=15)
+    ) == Schedule(time(0), time(23, 59), 3)
+
+
+def test_lead_time_crossing_midnight() -> None:
+    schedules = parse_schedule("0800-0000:0;0001-0800:2")
+
+    assert get_active_schedule(
+        schedules, datetime.combine(TODAY, time(23, 50)), timedelta(minutes=15)
+    ) == Schedule(time(0, 1), time(8), 2)
+
+
+def test_lead_time_across_days() -> None:
+    # Monday only, 1970-01-04 is a Sunday
+    schedules = parse_schedule("0(0000-2359:2);0000-2359:0")
+    lead_time = timedelta(minutes=30)
+
+    assert get_active_schedule(
+        schedules, datetime(1970, 1, 4, 23, 40), lead_time
+    ) == Schedule(time(0), time(23, 59), 2, 0, 0)
+    assert get_active_schedule(
+        schedules, datetime(1970, 1, 3, 23, 40), lead_time
+    ) == Schedule(time(0), time(23, 59), 0)
+
+
+def test_lead_time_across_dst() -> None:
+    timezone = ZoneInfo("Europe/London")
+    schedules = parse_schedule("0300-1200:2;0000-2359:0")
+    lead_time = timedelta(minutes=90)
+
+    # Clocks go forward at 0100 on 2024-03-31, so 0300 is only an hour away
+    assert get_active_schedule(
+        schedules, datetime(2024, 3, 31, 0, 45, tzinfo=timezone), lead_time
+    ) == Schedule(time(3), time(12), 2)
+    assert get_active_schedule(
+        schedules, datetime(2024, 3, 31, 0, 15, tzinfo=timezone), lead_time
+    ) == Schedule(time(0), time(23, 59), 0)
+
+    # Clocks go back at 0200 on 2024-10-27, so 0300 is two hours away
+    assert get_active_schedule(
+        schedules, datetime(2024, 10, 27, 1, 45, tzinfo=timezone), lead_time
+    ) == Schedule(time(0), time(23, 59), 0)
@@ -0,0 +1,56 @@
+from datetime import UTC, datetime
+
+from heroku_scheduled_scaling.state import AppState, FormationState
+
+
+def test_app_state_from_json() -> None:
+    app = AppState.from_json(
+        {
+            "id": "01234567-89ab-cdef-0123-456789abcdef",
+            "name": "example",
+            "maintenance": False,
+            "team": {"id": "team-id", "name": "team"},
+            "stack": {"id": "stack-id", "name": "heroku-24"},
+        }
+    )
+
+    assert app == AppState("01234567-89ab-cdef-0123-456789abcdef", "example", False)
+    assert not hasattr(app, "__dict__")
+
+
+def test_loads_formations() -> None:
+    app = AppState("app-id", "example", False)
+
+    app.load_formations(
+        [
+            {
+                "type": "web",
+                "quantity": 2,
+                "size": "Standard-1X",
+                "command": "gunicorn",
+                "updated_at": "2025-01-01T12:00:00Z",
+            },
+            {"type": "worker", "quantity": 0, "size": "Basic"},
+        ]
+    )
+
+    assert app.formations == {
+        "web": FormationState(
+            "web", 2, "Standard-1X", datetime(2025, 1, 1, 12, tzinfo=UTC)
+        ),
+        "worker": FormationState("worker", 0, "Basic"),
+    }
+
+
+def test_loads_schedule_vars() -> None:
+    app = AppState("app-id", "example", False)
+
+    app.load_config_vars(
+        {
+            "SCALING_SCHEDULE": "0900-1700:1",
+            "SCALING_SCHEDULE_DISABLE": None,
+            "SECRET_KEY": "secret",
+        }
+    )
+
+    assert app.schedule_vars == {"SCALING_SCHEDULE": "0900-1700:1"}
@@ -1,9 +1,12 @@
 from datetime import datetime
+from typing import Any
+from unittest.mock import MagicMock
 from zoneinfo import ZoneInfo
 
 import pytest
 
 from heroku_scheduled_scaling import utils
+from heroku_scheduled_scaling.state import AppState
 
 
 def test_get_zone_info() -> None:
@@ -26,3 +29,17 @@ def test_naive_datetime() -> None:
     assert not utils.is_naive(
         datetime.now().astimezone(ZoneInfo("America/Los_Angeles"))
     )
+
+
+def test_get_heroku_apps(monkeypatch: Any) -> None:
+    monkeypatch.setenv("HEROKU_TEAMS", "team-a,team-b")
+
+    heroku = MagicMock()
+    heroku._get_data.side_effect = lambda resource: [
+        {"id": f"{resource[1]}-app", "name": f"{resource[1]}-app", "maintenance": True}
+    ]
+
+    assert utils.get_heroku_apps(heroku) == [
+        AppState("team-a-app", "team-a-app", True),
+        AppState("team-b-app", "team-b-app", True),
+    ]